@@ -2,10 +2,35 @@ import os
 from langchain_together import TogetherEmbeddings
 from langchain_together import ChatTogether
 
-# Used for embedding
-embedding_function = TogetherEmbeddings(
-    model="BAAI/bge-large-en-v1.5",
-    api_key=os.getenv("TOGETHER_API_KEY")
+from .embedding_cache import CachedEmbeddings
+from ..utils.constants import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES
+
+EMBEDDING_MODEL = "BAAI/bge-large-en-v1.5"
+
+
+def get_base_embedding_function():
+    """
+    Embedding backend selected by EMBEDDING_BACKEND: "together" (default) or "onnx" to run the same model locally on CPU
+    """
+    if os.getenv("EMBEDDING_BACKEND") == "onnx":
+        from .onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings(
+            model_dir=os.getenv("ONNX_MODEL_DIR", "models/bge-large-en-v1.5"),
+            intra_op_threads=int(os.getenv("ONNX_THREADS", "0")) or None,
+        )
+
+    return TogetherEmbeddings(
+        model=EMBEDDING_MODEL,
+        api_key=os.getenv("TOGETHER_API_KEY")
+    )
+
+
+# Used for embedding. Vectors are cached on disk, so repeated texts are only embedded once.
+embedding_function = CachedEmbeddings(
+    get_base_embedding_function(),
+    model=EMBEDDING_MODEL,
+    path=EMBEDDING_CACHE_PATH,
+    max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
 )
 
 # Used for response generation
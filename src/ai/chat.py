@@ -2,8 +2,21 @@ import asyncio
 from langchain.prompts import PromptTemplate
 
 from .ai_models import qwen_2_5_7b_together_model
-from .rag_engine import respond_with_retrieved_context
+from .rag_engine import astream_with_retrieved_context
 from .ai_agent import get_ai_agent
+from ..utils.contact_index import ContactIndex
+from ..utils.constants import CONTACT_INDEX_PATH
+
+
+CONTACT_FIELD_LABELS = {
+    "phone_numbers": "Phone",
+    "emails": "Email",
+    "birthday": "Birthday",
+    "address": "Address",
+}
+
+contact_index = ContactIndex.load(CONTACT_INDEX_PATH)
+print(f"[Chat] Contact index loaded ({len(contact_index)} contacts)")
 
 
 intent_prompt = PromptTemplate(
@@ -16,12 +29,7 @@ intent_prompt = PromptTemplate(
     Intent:"""
 )
 
-def detect_intent(message: str) -> str:
-    """
-    Two possible intents of a prompt: "rag_query" or "tool_action
-    """
-    chain = intent_prompt | qwen_2_5_7b_together_model
-    result = chain.invoke({"message": message})
+def parse_intent(result) -> str:
     intent = result.content.strip().lower()
     if "tool" in intent:
         return "tool_action"
@@ -29,30 +37,63 @@ def detect_intent(message: str) -> str:
         return "rag_query"
 
 
-async def process_message(message: str):
+async def adetect_intent(message: str) -> str:
+    """
+    Two possible intents of a prompt: "rag_query" or "tool_action
+    """
+    chain = intent_prompt | qwen_2_5_7b_together_model
+    return parse_intent(await chain.ainvoke({"message": message}))
+
+
+def respond_with_contact_info(message: str):
+    """
+    Answer exact contact lookups like "what's Sam's number?" from the contact index, without the LLM or vector store
+    Returns None if the message isn't one, or the contact has none of the requested info
+    """
+    lookup = contact_index.find_lookup(message)
+    if not lookup:
+        return None
+    contact, fields = lookup
+
+    lines = []
+    for field in fields:
+        value = contact.get(field)
+        if value:
+            lines.append(f"{CONTACT_FIELD_LABELS[field]}: {', '.join(value) if isinstance(value, list) else value}")
+    if not lines:
+        return None
+    return "\n".join([contact.get("name", ""), *lines])
+
+
+async def stream_message(message: str):
     """
-    Determine how to handle incoming message (a.k.a. prompt)
+    Determine how to handle incoming message (a.k.a. prompt), yielding the completion as it is generated.
+    Only RAG completions are streamed. Contact lookups & tool actions are yielded whole.
     """
     print(f"[Chat] Processing incoming message: {message}")
 
+    contact_info = respond_with_contact_info(message)
+    if contact_info:
+        print("[Chat] Answered from contact index")
+        yield contact_info
+        return
+
     try:
-        intent = detect_intent(message)
+        intent = await adetect_intent(message)
 
-        completion = "Encountered error processing message"
         if intent == "tool_action":
             agent = get_ai_agent()
             llm_response = await asyncio.wait_for(
                 agent.arun(message),
                 timeout=120
             )
-            completion = llm_response if isinstance(llm_response, str) else str(llm_response)
+            yield llm_response if isinstance(llm_response, str) else str(llm_response)
         else:
-            completion = respond_with_retrieved_context(message)
+            async for content in astream_with_retrieved_context(message):
+                yield content
     except asyncio.TimeoutError as e:
         print(f"[Chat] Timed out processing message: {e}")
         raise e
     except Exception as e:
         print(f"[Chat] Error processing message: {e}")
         raise e
-
-    return completion
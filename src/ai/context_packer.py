@@ -0,0 +1,240 @@
+import os
+import re
+from threading import Lock
+
+import tiktoken
+
+from ..ingestion.message_store import format_message
+
+
+# Metadata rendered in passage headers, with their labels. Other fields, like IDs & timestamps, only matter for retrieval
+METADATA_FIELDS = [
+    ("type", None),
+    ("last_modified", None),
+    ("chat_name", "chat"),
+    ("participants", "with"),
+    ("sent_from", "from"),
+    ("subject", "subject"),
+    ("location", "location"),
+    ("filename", "file"),
+]
+# Shorter lines, like "thanks!", are kept even when repeated
+MIN_DUPLICATE_CHARACTERS = 30
+PASSAGE_SEPARATOR = "\n\n"
+# Average characters per token of English text, to estimate token counts without tiktoken's encoding
+CHARACTERS_PER_TOKEN = 4
+
+
+def normalize_line(line):
+    return re.sub(r"\s+", " ", line).strip().lower()
+
+
+def render_metadata(metadata):
+    """Compact passage header, ex: '[apple/messages | 2024-01-02 | chat: Sam | with: Sam]'"""
+    parts = []
+    for key, label in METADATA_FIELDS:
+        value = metadata.get(key)
+        if key == "sent_from" and isinstance(value, str):
+            value = value.strip("[]'\"") # stored as the string of a list
+        if key == "filename" and value:
+            value = os.path.basename(value)
+        if value in (None, ""):
+            continue
+        parts.append(f"{label}: {value}" if label else str(value))
+    return f"[{' | '.join(parts)}]"
+
+
+class CharacterEncoding:
+    """Fallback for tiktoken's encoding when it can't be loaded: a "token" per CHARACTERS_PER_TOKEN characters"""
+    def encode(self, text, disallowed_special=()):
+        return [text[i:i + CHARACTERS_PER_TOKEN] for i in range(0, len(text), CHARACTERS_PER_TOKEN)]
+
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+class Passage:
+    """Lines of one or more retrieved chunks of the same document, rendered under a single metadata header"""
+    def __init__(self, group, metadata, ordered):
+        self.group = group
+        self.metadata = metadata
+        self.ordered = ordered
+        self.lines = {} # line key -> text
+
+
+    def overlaps(self, keys):
+        # Chunks of the same document are always merged. Message windows only when they share messages.
+        return not self.ordered or any(key in self.lines for key in keys)
+
+
+    def add(self, units):
+        """Add (key, text) lines, returning how many were already in the passage"""
+        duplicates = 0
+        for key, text in units:
+            if key in self.lines:
+                duplicates += 1
+            else:
+                self.lines[key] = text
+        if self.ordered:
+            self.lines = dict(sorted(self.lines.items()))
+        return duplicates
+
+
+class ContextPacker:
+    """
+    Assembles retrieved documents into the RAG prompt context, within a token budget:
+    - message windows of a chat sharing messages, and chunks of the same document, are merged into one passage
+    - lines already in the context are dropped
+    - metadata is rendered as a compact header per passage
+    - passages are added in retrieval order until `max_tokens`, the last one truncated if at least `min_passage_tokens` fit
+
+    Token counts use tiktoken's cl100k_base encoding, an approximation of the chat model's tokenizer.
+    The encoding is loaded on the first `pack`, as tiktoken downloads it when it isn't cached (see TIKTOKEN_CACHE_DIR),
+    and token counts are estimated from characters if that fails.
+    """
+    def __init__(self, max_tokens=3000, min_passage_tokens=64, encoding_name="cl100k_base"):
+        self.max_tokens = max_tokens
+        self.min_passage_tokens = min_passage_tokens
+        self.encoding_name = encoding_name
+        self._encoding = None
+
+        self.requests = 0
+        self.tokens = 0
+        self.tokens_saved = 0
+        self.last_request = None
+        self._lock = Lock()
+
+
+    @property
+    def encoding(self):
+        if self._encoding is None:
+            with self._lock:
+                if self._encoding is None:
+                    try:
+                        self._encoding = tiktoken.get_encoding(self.encoding_name)
+                    except Exception as e:
+                        print(f"[Context Packer] Error loading the {self.encoding_name} encoding, estimating tokens from characters: {e}")
+                        self._encoding = CharacterEncoding()
+        return self._encoding
+
+
+    def count_tokens(self, text):
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+
+    def pack(self, documents, get_messages=None):
+        """
+        Context of ranked documents, and the request's stats.
+        `get_messages(document)` returns the messages of a message window expanded with its neighbours, or None for other documents.
+        """
+        passages = []
+        unpacked_context = ""
+        merged = 0
+        duplicate_lines = 0
+        for document in documents:
+            messages = get_messages(document) if get_messages else None
+            if messages:
+                group = ("chat", document.metadata.get("chat_id"))
+                units = [((message["date"], message["rowid"]), format_message(message)) for message in messages]
+                content = "\n".join(text for _, text in units)
+            else:
+                # Files like mbox & zip archives hold many documents, so chunks are only merged when they share their header
+                group = (
+                    "source",
+                    document.metadata.get("source_id") or document.id or document.page_content,
+                    render_metadata(document.metadata),
+                )
+                units = [(normalize_line(line), line.strip()) for line in document.page_content.split("\n") if line.strip()]
+                content = document.page_content
+            # Size of the context as it was assembled before packing, to measure the savings
+            unpacked_context += f"Content: {content}\nContent metadata: {document.metadata}\n\n"
+
+            keys = [key for key, _ in units]
+            passage = next((passage for passage in passages if passage.group == group and passage.overlaps(keys)), None)
+            if passage:
+                merged += 1
+            else:
+                passage = Passage(group, document.metadata, ordered=bool(messages))
+                passages.append(passage)
+            duplicate_lines += passage.add(units)
+
+        rendered, duplicate_lines_across = self._render(passages)
+        context, truncated, dropped = self._fit(rendered)
+
+        tokens = self.count_tokens(context)
+        unpacked_tokens = self.count_tokens(unpacked_context)
+        stats = {
+            "documents": len(documents),
+            "passages": len(rendered) - dropped,
+            "merged_chunks": merged,
+            "duplicate_lines": duplicate_lines + duplicate_lines_across,
+            "truncated_passages": truncated,
+            "dropped_passages": dropped,
+            "tokens": tokens,
+            "unpacked_tokens": unpacked_tokens,
+            "tokens_saved": max(unpacked_tokens - tokens, 0),
+        }
+        with self._lock:
+            self.requests += 1
+            self.tokens += tokens
+            self.tokens_saved += stats["tokens_saved"]
+            self.last_request = stats
+        return context, stats
+
+
+    def _render(self, passages):
+        """Passage texts, dropping long lines already in a previous passage, ex: quoted email replies"""
+        seen = set()
+        duplicates = 0
+        rendered = []
+        for passage in passages:
+            lines = []
+            for text in passage.lines.values():
+                normalized = normalize_line(text)
+                if len(normalized) >= MIN_DUPLICATE_CHARACTERS:
+                    if normalized in seen:
+                        duplicates += 1
+                        continue
+                    seen.add(normalized)
+                lines.append(text)
+            if lines:
+                rendered.append(render_metadata(passage.metadata) + "\n" + "\n".join(lines))
+        return rendered, duplicates
+
+
+    def _fit(self, rendered):
+        """Join passages within the token budget. Returns the context, and the number of truncated & dropped passages"""
+        separator_tokens = self.count_tokens(PASSAGE_SEPARATOR)
+        remaining = self.max_tokens
+        packed = []
+        truncated = 0
+        dropped = 0
+        for text in rendered:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            available = remaining - (separator_tokens if packed else 0)
+            if len(tokens) <= available:
+                packed.append(text)
+                remaining = available - len(tokens)
+            elif available >= self.min_passage_tokens:
+                text = self.encoding.decode(tokens[:available])
+                # Cut at the last whole line, keeping at least the header & a line
+                last_line_end = text.rfind("\n")
+                if last_line_end > text.find("\n"):
+                    text = text[:last_line_end]
+                packed.append(text)
+                remaining = 0
+                truncated += 1
+            else:
+                dropped += 1
+        return PASSAGE_SEPARATOR.join(packed), truncated, dropped
+
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "average_tokens": round(self.tokens / self.requests, 1) if self.requests else 0.0,
+                "tokens_saved": self.tokens_saved,
+                "last_request": self.last_request,
+            }
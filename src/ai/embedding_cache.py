@@ -0,0 +1,152 @@
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+from array import array
+from threading import Lock
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding function with a persistent SQLite cache keyed by (model, sha256(text)).
+    Least recently used entries are evicted once the cache holds more than `max_entries` vectors.
+    """
+    def __init__(self, embeddings, model, path, max_entries=250_000):
+        self.embeddings = embeddings
+        self.model = model
+        self.path = path
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL, "
+            "PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+    def embed_documents(self, texts):
+        return self._embed(texts, self.embeddings.embed_documents)
+
+
+    def embed_query(self, text):
+        return self._embed([text], lambda missing: [self.embeddings.embed_query(missing[0])])[0]
+
+
+    async def aembed_documents(self, texts):
+        return await self._aembed(texts, self.embeddings.aembed_documents)
+
+
+    async def aembed_query(self, text):
+        async def aembed_missing(missing):
+            return [await self.embeddings.aembed_query(missing[0])]
+        return (await self._aembed([text], aembed_missing))[0]
+
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": self._entries,
+        }
+
+
+    def _embed(self, texts, embed_missing):
+        hashes, vectors, missing = self._lookup(texts)
+        if missing:
+            vectors.update(self._store_missing(missing, embed_missing(list(missing.values()))))
+        return [vectors[text_hash] for text_hash in hashes]
+
+
+    async def _aembed(self, texts, aembed_missing):
+        # SQLite reads & writes run on a thread, so the event loop isn't blocked
+        hashes, vectors, missing = await asyncio.to_thread(self._lookup, texts)
+        if missing:
+            new_vectors = await aembed_missing(list(missing.values()))
+            vectors.update(await asyncio.to_thread(self._store_missing, missing, new_vectors))
+        return [vectors[text_hash] for text_hash in hashes]
+
+
+    def _lookup(self, texts):
+        """Hashes of texts, cached vectors by hash, and texts missing from the cache by hash"""
+        hashes = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+        vectors = self._get(set(hashes))
+
+        missing = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in vectors:
+                missing[text_hash] = text
+
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return hashes, vectors, missing
+
+
+    def _store_missing(self, missing, new_vectors):
+        new_vectors = dict(zip(missing.keys(), new_vectors))
+        self._put(new_vectors)
+        return new_vectors
+
+
+    def _get(self, hashes):
+        if not hashes:
+            return {}
+        hashes = list(hashes)
+        vectors = {}
+        with self._lock:
+            # Stay under SQLite's max number of query parameters
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [self.model, *batch],
+                ).fetchall()
+                for text_hash, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    vectors[text_hash] = vector.tolist()
+
+            if vectors:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, self.model, text_hash) for text_hash in vectors],
+                )
+                self._conn.commit()
+        return vectors
+
+
+    def _put(self, vectors):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(self.model, text_hash, array("f", vector).tobytes(), now) for text_hash, vector in vectors.items()],
+            )
+            # Re-count rather than adding the rowcount, which includes rows replacing an existing key
+            self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+            if self._entries > self.max_entries:
+                # Evict down to 90% of capacity so eviction doesn't run on every insert
+                excess = self._entries - int(self.max_entries * 0.9)
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._conn.commit()
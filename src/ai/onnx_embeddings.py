@@ -0,0 +1,80 @@
+import os
+import numpy as np
+import onnxruntime as ort
+from tokenizers import Tokenizer
+from langchain_core.embeddings import Embeddings
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Runs BAAI/bge-large-en-v1.5 locally on CPU with ONNX Runtime.
+    Uses CLS pooling and L2 normalization, so vectors are compatible with the ones embedded by Together.ai.
+
+    `model_dir` must contain `model.onnx` and `tokenizer.json`, e.g. exported with:
+    `optimum-cli export onnx --model BAAI/bge-large-en-v1.5 models/bge-large-en-v1.5`
+    """
+    def __init__(self, model_dir, max_length=512, max_batch_tokens=16384, intra_op_threads=None):
+        self.max_batch_tokens = max_batch_tokens
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.no_padding()
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads or os.cpu_count()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, "model.onnx"),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        print(f"[ONNX] Embedding model loaded from {model_dir} ({options.intra_op_num_threads} threads)")
+
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        encodings = self.tokenizer.encode_batch(texts)
+
+        # Dynamic batching: group texts of similar length so little compute is spent on padding,
+        # with each batch capped at `max_batch_tokens` padded tokens
+        order = sorted(range(len(texts)), key=lambda i: len(encodings[i].ids))
+        vectors = [None] * len(texts)
+        batch = []
+        for i in order:
+            if batch and (len(batch) + 1) * len(encodings[i].ids) > self.max_batch_tokens:
+                self._embed_batch(batch, encodings, vectors)
+                batch = []
+            batch.append(i)
+        if batch:
+            self._embed_batch(batch, encodings, vectors)
+
+        return vectors
+
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+    def _embed_batch(self, indices, encodings, vectors):
+        max_length = max(len(encodings[i].ids) for i in indices)
+        input_ids = np.zeros((len(indices), max_length), dtype=np.int64)
+        attention_mask = np.zeros((len(indices), max_length), dtype=np.int64)
+        for row, i in enumerate(indices):
+            ids = encodings[i].ids
+            input_ids[row, :len(ids)] = ids
+            attention_mask[row, :len(ids)] = 1
+
+        feeds = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": np.zeros_like(input_ids),
+        }
+        outputs = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+
+        # last_hidden_state -> CLS token. Some exports already output pooled sentence embeddings.
+        embeddings = outputs[:, 0] if outputs.ndim == 3 else outputs
+        embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        for row, i in enumerate(indices):
+            vectors[i] = embeddings[row].tolist()
@@ -0,0 +1,202 @@
+import os
+import json
+import uuid
+import sqlite3
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from ..utils.metadata_filter import get_where_sql
+
+
+def quantize(vectors):
+    """Symmetric per-vector int8 quantization. Returns (int8 vectors, float32 scales)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class QuantizedVectorStore(VectorStore):
+    """
+    Vector store over int8 vectors in a memory-mapped file, built from the Chroma collection
+    by `src/scripts/build_quantized_index.py`. Texts can also be appended with `add_texts`.
+
+    Queries scan the int8 vectors with batched dot products, then re-score the top candidates
+    against full precision float32 vectors, which stay on disk and are only paged in for those candidates.
+
+    Files in `path`:
+    - meta.json: vector count & dimensions
+    - vectors.i8: int8 vectors, (count, dim)
+    - scales.f32: per-vector dequantization scales, (count,)
+    - vectors.f32: normalized float32 vectors, (count, dim)
+    - documents.sqlite3: document IDs, contents & metadata by row
+    """
+    def __init__(self, path, embedding_function, rescore_candidates=64, block_size=65536):
+        self.path = path
+        self.embedding_function = embedding_function
+        self.rescore_candidates = rescore_candidates
+        self.block_size = block_size
+        self._conn = sqlite3.connect(os.path.join(path, "documents.sqlite3"), check_same_thread=False)
+        self._load()
+
+
+    @staticmethod
+    def create_index(path):
+        """Write an empty index in `path`, replacing any index there"""
+        os.makedirs(path, exist_ok=True)
+        for name in ("vectors.i8", "scales.f32", "vectors.f32"):
+            open(os.path.join(path, name), "wb").close()
+        conn = sqlite3.connect(os.path.join(path, "documents.sqlite3"))
+        conn.execute("DROP TABLE IF EXISTS documents")
+        conn.execute("CREATE TABLE documents (row INTEGER PRIMARY KEY, id TEXT NOT NULL, page_content TEXT, metadata TEXT)")
+        conn.commit()
+        conn.close()
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"count": 0, "dim": None}, f)
+
+
+    def _load(self):
+        with open(os.path.join(self.path, "meta.json"), "r") as f:
+            meta = json.load(f)
+        self.count = meta["count"]
+        self.dim = meta["dim"]
+
+        shape = (self.count, self.dim or 0)
+        if self.count == 0:
+            # Empty files can't be memory-mapped
+            self._vectors = np.empty(shape, dtype=np.int8)
+            self._scales = np.empty(0, dtype=np.float32)
+            self._full_vectors = np.empty(shape, dtype=np.float32)
+            return
+        self._vectors = np.memmap(os.path.join(self.path, "vectors.i8"), dtype=np.int8, mode="r", shape=shape)
+        self._scales = np.fromfile(os.path.join(self.path, "scales.f32"), dtype=np.float32)
+        self._full_vectors = np.memmap(os.path.join(self.path, "vectors.f32"), dtype=np.float32, mode="r", shape=shape)
+
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        """Returns documents with their cosine similarity to the query, most similar first"""
+        query_vector = self.embedding_function.embed_query(query)
+        return self.similarity_search_by_vector_with_score(query_vector, k, kwargs.get("filter"), kwargs.get("where_document"))
+
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, where_document=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter, where_document)]
+
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, where_document=None):
+        """`filter` & `where_document` are Chroma style `where` & `where_document` filters"""
+        rows = self.filter_rows(filter, where_document) if filter or where_document else None
+        rows, scores = self.search_rows(embedding, k, rows)
+        documents = self._get_documents(rows)
+        return list(zip(documents, scores))
+
+
+    def filter_rows(self, where=None, where_document=None):
+        """Sorted rows of the documents matching the filters"""
+        where_sql, params = get_where_sql(where, where_document)
+        rows = self._conn.execute(f"SELECT row FROM documents WHERE {where_sql} ORDER BY row", params).fetchall()
+        return np.array([row for row, in rows], dtype=np.int64)
+
+
+    def search_rows(self, embedding, k=4, rows=None):
+        """
+        Returns the rows of the `k` nearest vectors, and their exact cosine similarities.
+        Only the given sorted `rows` are searched, if any.
+        """
+        count = self.count if rows is None else len(rows)
+        if count == 0:
+            return [], []
+        query = normalize(embedding)
+
+        # Approximate scores over int8 vectors, a block at a time to bound the float32 working set
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, self.block_size):
+            end = min(start + self.block_size, count)
+            block = slice(start, end) if rows is None else rows[start:end]
+            scores[start:end] = (self._vectors[block].astype(np.float32) @ query) * self._scales[block]
+
+        candidates_count = min(max(self.rescore_candidates, k), count)
+        candidates = np.argpartition(-scores, candidates_count - 1)[:candidates_count]
+        if rows is not None:
+            candidates = rows[candidates]
+        candidates.sort() # sequential reads from the memory-mapped file
+
+        # Exact re-scoring of the candidates at full precision
+        exact_scores = self._full_vectors[candidates] @ query
+        top = np.argsort(-exact_scores)[:k]
+        return candidates[top].tolist(), exact_scores[top].tolist()
+
+
+    def _get_documents(self, rows):
+        if not rows:
+            return []
+        placeholders = ",".join("?" * len(rows))
+        records = self._conn.execute(
+            f"SELECT row, id, page_content, metadata FROM documents WHERE row IN ({placeholders})",
+            rows,
+        ).fetchall()
+        documents_by_row = {
+            row: Document(id=doc_id, page_content=page_content, metadata=json.loads(metadata or "{}"))
+            for row, doc_id, page_content, metadata in records
+        }
+        return [documents_by_row[row] for row in rows]
+
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        """Embed & append texts to the end of the index files. Returns their IDs"""
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{}] * len(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+
+        full_vectors = normalize(self.embedding_function.embed_documents(texts))
+        if self.dim is not None and full_vectors.shape[1] != self.dim:
+            raise ValueError(f"Embeddings have {full_vectors.shape[1]} dimensions, the index has {self.dim}")
+        vectors, scales = quantize(full_vectors)
+
+        for name, array in (("vectors.i8", vectors), ("scales.f32", scales), ("vectors.f32", full_vectors)):
+            with open(os.path.join(self.path, name), "ab") as f:
+                f.write(array.tobytes())
+        self._conn.executemany(
+            "INSERT INTO documents (row, id, page_content, metadata) VALUES (?, ?, ?, ?)",
+            [
+                (self.count + i, doc_id, text, json.dumps(metadata or {}))
+                for i, (doc_id, text, metadata) in enumerate(zip(ids, texts, metadatas))
+            ],
+        )
+        self._conn.commit()
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump({"count": self.count + len(texts), "dim": full_vectors.shape[1]}, f)
+
+        self._load()
+        return ids
+
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, path=None, **kwargs):
+        """New index in `path` holding `texts`. Other keyword arguments are passed to the constructor"""
+        if path is None:
+            raise ValueError("QuantizedVectorStore.from_texts needs the `path` to write the index to")
+        cls.create_index(path)
+        store = cls(path, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
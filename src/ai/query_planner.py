@@ -0,0 +1,218 @@
+import re
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime, timedelta
+import dateutil.parser
+from dateutil.relativedelta import relativedelta
+
+from ..utils.helpers import get_timestamp
+
+
+# Words of a prompt naming a source type, matched against the `type` metadata of chunks.
+# Words with other common meanings, like 'text', 'search' or 'drive', are left out, as filters exclude everything else
+SOURCE_TYPE_KEYWORDS = {
+    "apple/messages": {"texts", "texted", "texting", "imessage", "imessages", "messages"},
+    "apple/notes": {"note", "notes"},
+    "apple/contacts": {"contact", "contacts"},
+    "google/gmail": {"email", "emails", "emailed", "gmail", "inbox", "mail"},
+    "google/maps": {"maps"},
+    "google/calendar": {"calendar", "events", "meeting", "meetings"},
+    "google/search": {"searched", "googled"},
+    "google/youtube": {"youtube"},
+    "google/drive": {"docs", "gdrive"},
+}
+MONTHS = "january|february|march|april|may|june|july|august|september|october|november|december|jan|feb|mar|apr|jun|jul|aug|sep|sept|oct|nov|dec"
+NAME = r"[A-Z][\w'’-]*(?:\s+[A-Z][\w'’-]*)?"
+SENDER_PATTERNS = [
+    re.compile(rf"\b(?:from|by|with|text|texted|email|emailed|message|messaged)\s+({NAME})"),
+    re.compile(rf"\b({NAME})\s+(?:say|said|says|text|texted|send|sent|write|wrote|email|emailed|tell|told|mention|mentioned|ask|asked)\b"),
+]
+# Capitalized words which aren't senders
+NON_SENDER_WORDS = {
+    "i", "me", "my", "you", "we", "they", "he", "she", "the", "a", "an", "what", "when", "who", "last", "this",
+    "has", "have", "had", "can", "could", "will", "would", "shall", "should", "might", "must", "do", "did", "does",
+    "is", "was", "are", "were", "am",
+    "today", "yesterday", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+    "google", "gmail", "youtube", "maps", "imessage", "icloud", "apple",
+    *MONTHS.split("|"),
+}
+# A year isn't read from digits within a phone number, ex: '415-555-2013' or '(415) 555 2013', or from a street number, ex: '2048 Oak Ave'
+STREET_SUFFIXES = "st|street|ave|avenue|rd|road|blvd|boulevard|dr|drive|ln|lane|way|ct|court|pl|place|pkwy|parkway|hwy|highway|terrace|circle"
+YEAR_PATTERN = re.compile(
+    rf"(?<![\w$#+./()-])(?<!\d\s)(19\d{{2}}|20\d{{2}})(?![\w./-]|\)|\s+(?:[\w'-]+\s+){{0,2}}(?:{STREET_SUFFIXES})\b)",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class QueryPlan:
+    """Retrieval filters extracted from a prompt by `plan_query`"""
+    source_types: list = field(default_factory=list)
+    senders: list = field(default_factory=list)
+    # Inclusive (start, end) dates, either of which is None for open ranges
+    date_range: tuple = None
+
+
+    def relaxations(self):
+        """
+        The plan, then plans with fewer filters: without senders, then source types, then the date range,
+        the filters most likely to be wrong going first
+        """
+        plans = [self]
+        for relaxed_field, empty in (("senders", []), ("source_types", []), ("date_range", None)):
+            if getattr(plans[-1], relaxed_field) != empty:
+                plans.append(replace(plans[-1], **{relaxed_field: empty}))
+        return plans
+
+
+    @property
+    def where(self):
+        """Chroma metadata filter, on the `type` & epoch `ts` fields of chunks"""
+        conditions = []
+        if self.source_types:
+            conditions.append({"type": {"$in": self.source_types}})
+        start, end = self.date_range or (None, None)
+        if start:
+            conditions.append({"ts": {"$gte": get_timestamp(start)}})
+        if end:
+            conditions.append({"ts": {"$lt": get_timestamp(end + timedelta(days=1))}})
+        if len(conditions) > 1:
+            return {"$and": conditions}
+        return conditions[0] if conditions else None
+
+
+    @property
+    def where_document(self):
+        """Chroma document filter. Senders are matched in the content, where message transcripts name them"""
+        conditions = [{"$contains": sender} for sender in self.senders]
+        if len(conditions) > 1:
+            return {"$or": conditions}
+        return conditions[0] if conditions else None
+
+
+    @property
+    def search_kwargs(self):
+        kwargs = {"filter": self.where, "where_document": self.where_document}
+        return {key: value for key, value in kwargs.items() if value}
+
+
+def get_relative_date_range(text, today):
+    """Date range of phrases like 'yesterday', 'last 3 weeks', 'this month', 'last year'"""
+    if re.search(r"\btoday\b", text):
+        return today, today
+    if re.search(r"\byesterday\b", text):
+        return today - timedelta(days=1), today - timedelta(days=1)
+
+    match = re.search(r"\b(?:last|past|previous)\s+(\d+)\s+(day|week|month|year)s?\b", text)
+    if match:
+        return today - relativedelta(**{f"{match.group(2)}s": int(match.group(1))}), today
+
+    match = re.search(r"\b(this|last|past|previous)\s+(week|month|year)\b", text)
+    if not match:
+        return None
+    which, unit = match.groups()
+    if which == "past":
+        return today - relativedelta(**{f"{unit}s": 1}), today
+    period_start = {
+        "week": today - timedelta(days=today.weekday()),
+        "month": today.replace(day=1),
+        "year": today.replace(month=1, day=1),
+    }[unit]
+    if which == "this":
+        return period_start, today
+    return period_start - relativedelta(**{f"{unit}s": 1}), period_start - timedelta(days=1)
+
+
+def get_absolute_date_range(prompt, today):
+    """
+    Date range of a date, month or year named in a prompt, ex: '2024-01-05', 'Jan 5th', 'March 2023', '2021',
+    and the position where it is named. Dates without a year are the most recent past ones.
+    """
+    for match in re.finditer(r"\b\d{4}-\d{1,2}-\d{1,2}\b", prompt):
+        try:
+            day = dateutil.parser.parse(match.group(0)).date()
+        except (ValueError, OverflowError):
+            continue
+        return day, day, match.start()
+
+    match = re.search(rf"\b({MONTHS})\.?\s+(\d{{1,2}})(?:st|nd|rd|th)?\b(?:,?\s+(\d{{4}}))?", prompt, re.IGNORECASE)
+    if match:
+        month, day, year = match.groups()
+        try:
+            day = dateutil.parser.parse(f"{month} {day} {year or today.year}").date()
+        except (ValueError, OverflowError):
+            day = None
+        if day:
+            if not year and day > today:
+                day -= relativedelta(years=1)
+            return day, day, match.start()
+
+    for match in re.finditer(rf"\b({MONTHS})\.?\b(?:\s+(\d{{4}}))?", prompt, re.IGNORECASE):
+        month, year = match.groups()
+        # 'may' is usually the verb
+        if month.lower() == "may" and not year:
+            continue
+        month_start = date(int(year) if year else today.year, dateutil.parser.parse(month, default=datetime(2000, 1, 1)).month, 1)
+        if not year and month_start > today:
+            month_start -= relativedelta(years=1)
+        return month_start, month_start + relativedelta(months=1) - timedelta(days=1), match.start()
+
+    match = YEAR_PATTERN.search(prompt)
+    if match:
+        year = int(match.group(1))
+        return date(year, 1, 1), date(year, 12, 31), match.start()
+    return None
+
+
+def get_date_range(prompt, today=None):
+    """
+    (start, end) dates a prompt refers to, or None. 'since' & 'after' a date, and 'before' a date are open ranges,
+    ex: 'since March' -> (March 1st, today)
+    """
+    today = today or date.today()
+    date_range = get_relative_date_range(prompt.lower(), today)
+    if date_range:
+        return date_range
+
+    absolute_range = get_absolute_date_range(prompt, today)
+    if not absolute_range:
+        return None
+    start, end, position = absolute_range
+    preceding = prompt[:position].lower().split()[-1:]
+    if preceding in (["since"], ["after"]):
+        return (end + timedelta(days=1) if preceding == ["after"] else start), today
+    if preceding == ["before"]:
+        return None, start - timedelta(days=1)
+    return start, end
+
+
+def get_senders(prompt):
+    """Capitalized names of people a prompt asks about messages from or to, ex: 'what did Sam say about the trip?' -> ['Sam']"""
+    senders = []
+    for pattern in SENDER_PATTERNS:
+        for match in pattern.finditer(prompt):
+            words = [re.sub(r"['’]s$", "", word) for word in match.group(1).split()]
+            while words and words[0].lower() in NON_SENDER_WORDS:
+                words.pop(0)
+            while words and words[-1].lower() in NON_SENDER_WORDS:
+                words.pop()
+            sender = " ".join(words)
+            if sender and sender not in senders:
+                senders.append(sender)
+    return senders
+
+
+def get_source_types(prompt):
+    words = set(re.findall(r"[a-z]+", prompt.lower()))
+    return [source_type for source_type, keywords in SOURCE_TYPE_KEYWORDS.items() if words & keywords]
+
+
+def plan_query(prompt, today=None):
+    """
+    Rule based query planner: source types, senders and a date range named in the prompt,
+    used to search a smaller set of candidate chunks
+    """
+    return QueryPlan(
+        source_types=get_source_types(prompt),
+        senders=get_senders(prompt),
+        date_range=get_date_range(prompt, today),
+    )
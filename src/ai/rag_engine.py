@@ -1,15 +1,111 @@
+import os
+import time
+import asyncio
 from langchain_chroma import Chroma
 from langchain.prompts import PromptTemplate
 
 from .ai_models import embedding_function, llama_3_70b_free_together_model_creative, qwen_2_5_7b_together_model
-from ..utils.constants import CHROMA_PATH
+from .response_cache import SemanticResponseCache
+from .rank_fusion import fuse_rankings, get_document_key
+from .context_packer import ContextPacker
+from .query_planner import plan_query
+from ..ingestion.message_store import MessageStore
+from ..ingestion.lexical_index import LexicalIndex
+from ..utils.constants import (
+    CHROMA_PATH,
+    QUANTIZED_INDEX_PATH,
+    MESSAGE_STORE_PATH,
+    CORPUS_VERSION_PATH,
+    LEXICAL_INDEX_PATH,
+    LEXICAL_SEARCH_BUDGET_MS,
+    RESPONSE_CACHE_THRESHOLD,
+    RESPONSE_CACHE_TTL_SECONDS,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RAG_CONTEXT_MAX_TOKENS,
+)
+
+
+# Messages before & after a retrieved message window added to the context
+MESSAGE_CONTEXT_NEIGHBOURS = 5
+RETRIEVED_DOCUMENTS = 8
+# Documents retrieved from each of the vector & lexical indexes before rank fusion
+HYBRID_CANDIDATES = 20
+RETRIEVAL_ERROR_RESPONSE = "I'm sorry, I'm having trouble retrieving the context. Please try again later."
 
+def load_vectorstore():
+    """
+    Vector store selected by VECTOR_STORE_BACKEND: "chroma" (default),
+    or "quantized" for the compact int8 index built by src/scripts/build_quantized_index.py
+    """
+    if os.getenv("VECTOR_STORE_BACKEND") == "quantized":
+        from .quantized_store import QuantizedVectorStore
+        store = QuantizedVectorStore(QUANTIZED_INDEX_PATH, embedding_function)
+        print(f"[RAG] Quantized vector store loaded from {QUANTIZED_INDEX_PATH} ({store.count} vectors)")
+        return store
 
-vectorstore = Chroma(
-    persist_directory=CHROMA_PATH,
-    embedding_function=embedding_function,
+    store = Chroma(
+        persist_directory=CHROMA_PATH,
+        embedding_function=embedding_function,
+    )
+    print(f"[RAG] Vector store loaded from {CHROMA_PATH}")
+    return store
+
+
+vectorstore = load_vectorstore()
+message_store = MessageStore(MESSAGE_STORE_PATH) if os.path.exists(MESSAGE_STORE_PATH) else None
+lexical_index = LexicalIndex(LEXICAL_INDEX_PATH) if os.path.exists(LEXICAL_INDEX_PATH) else None
+# Responses to similar prompts are reused until ingestion changes the corpus
+response_cache = SemanticResponseCache(
+    CORPUS_VERSION_PATH,
+    threshold=RESPONSE_CACHE_THRESHOLD,
+    ttl=RESPONSE_CACHE_TTL_SECONDS,
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
 )
-print(f"[RAG] Vector store loaded from {CHROMA_PATH}")
+context_packer = ContextPacker(max_tokens=RAG_CONTEXT_MAX_TOKENS)
+
+
+def expand_message_window(document):
+    """Messages of a retrieved message window with its neighbouring messages, or None if the document isn't one"""
+    metadata = document.metadata
+    if not message_store or "first_rowid" not in metadata:
+        return None
+    return message_store.get_context(
+        metadata["chat_id"], metadata["first_rowid"], metadata["last_rowid"], MESSAGE_CONTEXT_NEIGHBOURS
+    ) or None
+
+
+async def asearch_documents(prompt, embedding, plan):
+    if not lexical_index:
+        return await vectorstore.asimilarity_search_by_vector(embedding, k=RETRIEVED_DOCUMENTS, **plan.search_kwargs)
+    vector_documents, lexical_documents = await asyncio.gather(
+        vectorstore.asimilarity_search_by_vector(embedding, k=HYBRID_CANDIDATES, **plan.search_kwargs),
+        asyncio.to_thread(lexical_index.search, prompt, HYBRID_CANDIDATES, LEXICAL_SEARCH_BUDGET_MS, plan.where, plan.where_document),
+    )
+    return fuse_rankings([vector_documents, lexical_documents], RETRIEVED_DOCUMENTS)
+
+
+async def aretrieve_documents(prompt, embedding, plan):
+    """
+    Hybrid retrieval: vector search results merged with lexical (BM25) search results by reciprocal rank fusion,
+    so that exact names, numbers, and rare words are found even when their embeddings aren't close to the prompt's.
+    The searches run concurrently. Both are filtered by the prompt's query plan. When fewer documents than needed match it,
+    the plan's filters are relaxed one at a time, and the documents matching the relaxed plans are added after the ones matching it.
+    """
+    documents = []
+    seen = set()
+    for relaxed_plan in plan.relaxations():
+        if relaxed_plan is not plan:
+            print(f"[RAG] {len(documents)} documents match the query plan filters. Relaxing them: {relaxed_plan}")
+        elif plan.where or plan.where_document:
+            print(f"[RAG] {plan}")
+        for document in await asearch_documents(prompt, embedding, relaxed_plan):
+            key = get_document_key(document)
+            if key not in seen:
+                seen.add(key)
+                documents.append(document)
+        if len(documents) >= RETRIEVED_DOCUMENTS:
+            break
+    return documents[:RETRIEVED_DOCUMENTS]
 
 
 rag_prompt_template = PromptTemplate(
@@ -31,25 +127,74 @@ Reply using LESS THAN 200 words.
 *Prompt:* {prompt}"""
 )
 
-def respond_with_retrieved_context(prompt):
+def build_rag_context(documents):
+    rag_context, stats = context_packer.pack(documents, expand_message_window)
+    print(
+        f"[RAG] Packed {stats['documents']} documents into {stats['passages']} passages: "
+        f"{stats['tokens']} tokens, {stats['tokens_saved']} saved"
+    )
+    return rag_context
+
+
+def get_response_content(llm_response):
+    return llm_response.content if hasattr(llm_response, 'content') else str(llm_response)
+
+
+def get_rag_stats():
+    return {
+        "response_cache": response_cache.stats(),
+        "embedding_cache": embedding_function.stats(),
+        "context_packer": context_packer.stats(),
+    }
+
+
+async def astream_with_retrieved_context(prompt):
+    """
+    Respond to a prompt with the LLM, given the context retrieved for it, yielding the response as the LLM generates it,
+    so that replies start showing after the first tokens rather than the whole completion.
+    Other conversations, Discord heartbeats, and scheduled jobs keep running while waiting on embedding, retrieval, and the LLM.
+    Cached responses & errors are yielded whole.
+    """
+    start = time.perf_counter()
     try:
-        rag_documents = vectorstore.similarity_search(prompt, k=8)
-        print(f"[RAG] Retrieved {len(rag_documents)} documents")
+        embedding = await embedding_function.aembed_query(prompt)
+        # Responses are cached per resolved date range, as relative dates like 'yesterday' change meaning daily
+        plan = plan_query(prompt)
+        cached_response, corpus_version = await asyncio.to_thread(response_cache.get, embedding, plan.date_range)
+        if cached_response is None:
+            rag_documents = await aretrieve_documents(prompt, embedding, plan)
+            print(f"[RAG] Retrieved {len(rag_documents)} documents. Embedding cache: {embedding_function.stats()}")
     except Exception as e:
         print(f"[RAG] Error retrieving context: {e}")
-        return "I'm sorry, I'm having trouble retrieving the context. Please try again later."
+        yield RETRIEVAL_ERROR_RESPONSE
+        return
+
+    if cached_response is not None:
+        print(f"[RAG] Response cache hit. Response cache: {response_cache.stats()}")
+        yield cached_response
+        return
 
-    rag_context = ""
-    for document in rag_documents:
-        metadata = document.metadata
-        rag_context += (
-            f"Content: {document.page_content}\nContent metadata: {metadata}\n\n"
-        )
+    # Expanding message windows reads the message store
+    rag_context = await asyncio.to_thread(build_rag_context, rag_documents)
 
     chain = rag_prompt_template | llama_3_70b_free_together_model_creative
-    llm_response = chain.invoke({
+    parts = []
+    async for llm_chunk in chain.astream({
         "prompt": prompt,
         "context": rag_context,
-    })
+    }):
+        content = get_response_content(llm_chunk)
+        if not content:
+            continue
+        if not parts:
+            print(f"[RAG] Time to first token: {time.perf_counter() - start:.2f}s")
+        parts.append(content)
+        yield content
 
-    return llm_response.content if hasattr(llm_response, 'content') else str(llm_response)
+    # Only complete responses are cached, not ones whose consumer stopped early
+    response_cache.put(prompt, embedding, "".join(parts), corpus_version, plan.date_range)
+
+
+async def arespond_with_retrieved_context(prompt):
+    """Response of `astream_with_retrieved_context` as a whole"""
+    return "".join([content async for content in astream_with_retrieved_context(prompt)])
@@ -0,0 +1,22 @@
+# Dampens the weight of top ranks, so that a document ranked well by several retrievers beats one ranked first by a single retriever
+RRF_K = 60
+
+
+def get_document_key(document):
+    return document.id or document.page_content
+
+
+def fuse_rankings(rankings, k, rrf_k=RRF_K):
+    """
+    Merge ranked document lists from different retrievers with reciprocal rank fusion:
+    each document scores the sum of 1 / (rrf_k + rank) over the lists it appears in.
+    Only ranks are used, so the retrievers' scores don't need to be comparable.
+    """
+    scores = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            key = get_document_key(document)
+            scores[key] = scores.get(key, 0.0) + 1 / (rrf_k + rank)
+            documents.setdefault(key, document)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)[:k]]
@@ -0,0 +1,114 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+import numpy as np
+
+from ..ingestion.corpus_version import get_corpus_version
+
+
+class SemanticResponseCache:
+    """
+    In-memory cache of responses, keyed by the embedding of their prompt.
+    A prompt whose embedding has a cosine similarity of at least `threshold` with a cached prompt gets its response.
+
+    Responses are only valid for the corpus version they were generated from: the whole cache is cleared
+    when ingestion changes the corpus. Entries also expire after `ttl` seconds, and the least recently used
+    entries are evicted beyond `max_entries`.
+
+    Keep the threshold high: prompts differing by a single name, like "mom's address" & "dad's address",
+    can still have very similar embeddings.
+
+    Entries can be given a `scope`, ex: the dates a prompt resolves to, and only match prompts of the same scope,
+    so that "what did I do yesterday?" isn't answered with the response from the day before.
+    """
+    def __init__(self, corpus_version_path, threshold=0.97, ttl=86400, max_entries=1000):
+        self.corpus_version_path = corpus_version_path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict() # id -> (prompt, response, created_at, scope)
+        self._vectors = {} # id -> normalized prompt embedding
+        self._next_id = 0
+        self._corpus_version = get_corpus_version(corpus_version_path)
+        self._lock = Lock()
+
+
+    def get(self, embedding, scope=None):
+        """
+        Cached response for a prompt embedding of the given scope, or None.
+        Also returns the corpus version to pass to `put`, so responses generated while the corpus changed aren't cached.
+        """
+        corpus_version = get_corpus_version(self.corpus_version_path)
+        vector = self._normalize(embedding)
+        with self._lock:
+            if corpus_version != self._corpus_version:
+                self._clear(corpus_version)
+            self._expire()
+
+            best_id, best_similarity = None, -1.0
+            for entry_id, cached_vector in self._vectors.items():
+                if self._entries[entry_id][3] != scope:
+                    continue
+                similarity = float(np.dot(vector, cached_vector))
+                if similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None or best_similarity < self.threshold:
+                self.misses += 1
+                return None, corpus_version
+
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id][1], corpus_version
+
+
+    def put(self, prompt, embedding, response, corpus_version, scope=None):
+        with self._lock:
+            if corpus_version != self._corpus_version:
+                return
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (prompt, response, time.time(), scope)
+            self._vectors[entry_id] = self._normalize(embedding)
+            while len(self._entries) > self.max_entries:
+                evicted_id, _ = self._entries.popitem(last=False)
+                del self._vectors[evicted_id]
+
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": len(self._entries),
+            "invalidations": self.invalidations,
+        }
+
+
+    def _clear(self, corpus_version):
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self._vectors.clear()
+        self._corpus_version = corpus_version
+
+
+    def _expire(self):
+        now = time.time()
+        for entry_id in list(self._entries):
+            if now - self._entries[entry_id][2] < self.ttl:
+                continue
+            del self._entries[entry_id]
+            del self._vectors[entry_id]
+
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,248 @@
+import io
+import os
+import re
+import csv
+import json
+import zipfile
+from datetime import datetime
+from html.parser import HTMLParser
+
+import docx
+import vobject
+from langchain_core.documents import Document
+
+from .chunkers import chunk_by_title, chunk_rows, split_text
+
+
+READ_BLOCK_SIZE = 1 << 16
+ARCHIVE_EXTENSIONS = (".json", ".html", ".docx", ".csv", ".ics", ".txt")
+
+
+def get_member_type(name):
+    """Data type of an export archive member, from its path within Google Takeout or iCloud exports"""
+    lowered = name.lower()
+    if "/search/" in lowered:
+        return "google/search"
+    if "youtube" in lowered:
+        return "google/youtube"
+    if lowered.endswith(".ics"):
+        return "google/calendar"
+    if "maps" in lowered and lowered.endswith(".csv"):
+        return "google/maps"
+    if "drive/" in lowered:
+        return "google/drive"
+    if "notes/" in lowered:
+        return "apple/notes"
+    return "archive"
+
+
+def iter_json_array(stream, block_size=READ_BLOCK_SIZE):
+    """
+    Yield the items of a top-level JSON array, decoding one item at a time from a text stream
+    instead of loading the whole file. Any other JSON value is yielded as a single item.
+    """
+    decoder = json.JSONDecoder()
+    incomplete = object()
+    buffer = ""
+    position = 0
+    in_array = False
+    eof = False
+    while True:
+        while position < len(buffer) and (buffer[position] in " \t\r\n," or (buffer[position] == "[" and not in_array)):
+            in_array = in_array or buffer[position] == "["
+            position += 1
+        if in_array and position < len(buffer) and buffer[position] == "]":
+            return
+
+        item = incomplete
+        if position < len(buffer):
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                pass
+            else:
+                # A value may be cut short by the end of the buffer, like '1.' of '1.5', so it is only
+                # complete once followed by a delimiter, or the end of the stream
+                next_position = end
+                while next_position < len(buffer) and buffer[next_position] in " \t\r\n":
+                    next_position += 1
+                if next_position == len(buffer):
+                    complete = eof
+                else:
+                    complete = not in_array or buffer[next_position] in ",]"
+                if not complete:
+                    item = incomplete
+
+        if item is incomplete:
+            if eof:
+                if buffer[position:].strip() or in_array:
+                    raise ValueError("Truncated or invalid JSON")
+                return
+            block = stream.read(block_size)
+            eof = not block
+            buffer = buffer[position:] + block
+            position = 0
+            continue
+
+        yield item
+        position = end
+
+
+class ActivityHTMLParser(HTMLParser):
+    """
+    Incrementally collects the text of each activity cell of a Takeout "My Activity" html file.
+    Html without activity cells is collected as a single entry.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.entries = []
+        self._parts = []
+        self._skip_depth = 0
+
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self._skip_depth += 1
+        elif tag == "div" and "outer-cell" in (dict(attrs).get("class") or ""):
+            self.flush()
+        elif tag in ("br", "p", "div"):
+            self._parts.append(" ")
+
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style"):
+            self._skip_depth = max(self._skip_depth - 1, 0)
+
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._parts.append(data)
+
+
+    def flush(self):
+        text = re.sub(r"\s+", " ", "".join(self._parts)).strip()
+        if text:
+            self.entries.append(text)
+        self._parts = []
+
+
+def iter_html_entries(stream, block_size=READ_BLOCK_SIZE):
+    parser = ActivityHTMLParser()
+    for block in iter(lambda: stream.read(block_size), ""):
+        parser.feed(block)
+        yield from parser.entries
+        parser.entries = []
+    parser.close()
+    parser.flush()
+    yield from parser.entries
+
+
+def get_activity_entry(item):
+    """(date, text) of a Takeout activity, ex: Search or YouTube history"""
+    if not isinstance(item, dict):
+        return None, json.dumps(item)
+    text = item.get("title", "")
+    subtitles = [subtitle.get("name", "") for subtitle in item.get("subtitles", []) if isinstance(subtitle, dict)]
+    if subtitles:
+        text += f" ({', '.join(subtitles)})"
+    date = item.get("time", "")[:10] or None
+    return date, f"{date} {text}" if date else text
+
+
+def get_event_entry(event):
+    """(date, text) of a calendar event"""
+    date = None
+    if hasattr(event, "dtstart"):
+        date = event.dtstart.value.isoformat()[:10]
+    text = event.summary.value if hasattr(event, "summary") else ""
+    if hasattr(event, "location") and event.location.value:
+        text += f" at {event.location.value}"
+    if hasattr(event, "description") and event.description.value:
+        text += f": {event.description.value}"
+    return date, f"{date} {text}" if date else text
+
+
+def iter_entry_chunks(entries, max_characters):
+    """Group (date, text) entries into chunks of at most `max_characters`, yielding (text, date of last entry)"""
+    current = []
+    length = 0
+    last_date = None
+    for date, text in entries:
+        text = re.sub(r"\s+", " ", text).strip()
+        if not text:
+            continue
+        for piece in split_text(text, max_characters):
+            if current and length + 1 + len(piece) > max_characters:
+                yield "\n".join(current), last_date
+                current = []
+                length = 0
+            current.append(piece)
+            length += len(piece) + 1
+        last_date = date or last_date
+    if current:
+        yield "\n".join(current), last_date
+
+
+def iter_member_chunks(archive, info, max_characters):
+    """Yield (text, date) chunks of an archive member, read as a stream"""
+    name = info.filename.lower()
+    with archive.open(info) as raw:
+        if name.endswith(".docx"):
+            # python-docx needs a seekable file, which zip members are
+            text = "\n\n".join(paragraph.text for paragraph in docx.Document(raw).paragraphs)
+            for chunk in chunk_by_title(text, max_characters):
+                yield chunk, None
+            return
+
+        stream = io.TextIOWrapper(raw, encoding="utf-8", errors="replace", newline="")
+        if name.endswith(".json"):
+            yield from iter_entry_chunks(map(get_activity_entry, iter_json_array(stream)), max_characters)
+        elif name.endswith(".html"):
+            yield from iter_entry_chunks(((None, entry) for entry in iter_html_entries(stream)), max_characters)
+        elif name.endswith(".ics"):
+            events = (
+                get_event_entry(event)
+                for calendar in vobject.readComponents(stream, ignoreUnreadable=True)
+                for event in getattr(calendar, "vevent_list", [])
+            )
+            yield from iter_entry_chunks(events, max_characters)
+        elif name.endswith(".csv"):
+            reader = csv.reader(stream)
+            for chunk in chunk_rows(next(reader, []), reader, max_characters):
+                yield chunk, None
+        elif name.endswith(".txt"):
+            for chunk in chunk_by_title(stream.read(), max_characters):
+                yield chunk, None
+
+
+def iter_archive_documents(_file_paths, _chunk_max_characters):
+    """
+    Stream documents out of Google Takeout & iCloud export zip files, without extracting them to disk.
+    The zip file is the document source, and the member path is kept as `filename`.
+    """
+    for path in _file_paths:
+        try:
+            archive = zipfile.ZipFile(path)
+        except (OSError, zipfile.BadZipFile) as e:
+            print(f"Error opening archive {path}: {e}. Skipping...")
+            continue
+
+        with archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(ARCHIVE_EXTENSIONS):
+                    continue
+                member_date = datetime(*info.date_time).date().isoformat()
+                metadata = {
+                    "source": path,
+                    "file_directory": os.path.dirname(path),
+                    "filename": info.filename,
+                    "member_type": get_member_type(info.filename),
+                }
+                try:
+                    for text, date in iter_member_chunks(archive, info, _chunk_max_characters):
+                        yield Document(
+                            page_content=text,
+                            metadata={**metadata, "last_modified": date or member_date},
+                        )
+                except Exception as e:
+                    print(f"Error reading {info.filename} in {path}: {e}. Skipping...")
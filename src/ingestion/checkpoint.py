@@ -0,0 +1,121 @@
+import os
+import json
+from threading import Lock
+
+
+class CheckpointJournal:
+    """
+    Append-only journal of an ingestion run's committed batches and completed files.
+
+    A file is completed once it has been fully parsed and all of its chunks are stored.
+    An interrupted run can be resumed from the journal: completed files are not re-parsed,
+    and chunks from committed batches are not re-embedded.
+    """
+    def __init__(self, path, run_key):
+        self.path = path
+        self.run_key = run_key
+        self.completed_files = {} # path -> {"sha256", "mtime", "size", "chunk_ids"}
+        self.committed_ids = set()
+
+        self._file = None
+        self._file_hashes = {}
+        self._chunk_ids = {}
+        self._pending_ids = {}
+        self._path_by_id = {}
+        self._parsed_paths = set()
+        self._lock = Lock()
+
+
+    def load(self):
+        """Load a previous run's journal. Returns False if there is none for the same run configuration."""
+        if not os.path.exists(self.path):
+            return False
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        if not lines or json.loads(lines[0]).get("run_key") != self.run_key:
+            return False
+
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break # partially written last line of an interrupted run
+            if "batch" in entry:
+                self.committed_ids.update(entry["batch"])
+            elif "file" in entry:
+                self.completed_files[entry["file"]] = entry
+        return True
+
+
+    def open(self, file_hashes, append=False):
+        """Start journaling. `file_hashes` maps the paths being ingested to their sha256."""
+        self._file_hashes = file_hashes
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, "a" if append else "w", encoding="utf-8")
+        if not append:
+            self._append({"run_key": self.run_key})
+
+
+    def close(self, remove=False):
+        if self._file:
+            self._file.close()
+            self._file = None
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+    def mark_committed(self, ids):
+        """Treat chunks stored before this run as committed, so they aren't embedded again"""
+        with self._lock:
+            self.committed_ids.update(ids)
+
+
+    def track(self, path, doc_id):
+        """Track a parsed chunk. Returns False if the chunk was already committed by a previous run."""
+        with self._lock:
+            self._chunk_ids.setdefault(path, set()).add(doc_id)
+            pending_ids = self._pending_ids.setdefault(path, set())
+            if doc_id in self.committed_ids:
+                return False
+            pending_ids.add(doc_id)
+            self._path_by_id[doc_id] = path
+            return True
+
+
+    def file_parsed(self, path):
+        with self._lock:
+            self._parsed_paths.add(path)
+            self._complete_if_done(path)
+
+
+    def batch_committed(self, ids):
+        with self._lock:
+            self._append({"batch": ids})
+            for doc_id in ids:
+                path = self._path_by_id.pop(doc_id, None)
+                if path is not None:
+                    self._pending_ids[path].discard(doc_id)
+                    self._complete_if_done(path)
+
+
+    def _complete_if_done(self, path):
+        if path not in self._parsed_paths or self._pending_ids.get(path):
+            return
+        stats = os.stat(path) if os.path.isfile(path) else None
+        self._append({
+            "file": path,
+            "sha256": self._file_hashes.get(path),
+            "mtime": stats.st_mtime if stats else None,
+            "size": stats.st_size if stats else None,
+            "chunk_ids": sorted(self._chunk_ids.get(path, set())),
+        })
+        self._parsed_paths.discard(path)
+
+
+    def _append(self, entry):
+        if not self._file:
+            return
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
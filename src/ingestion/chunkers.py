@@ -0,0 +1,117 @@
+import re
+
+
+def split_text(text, max_characters):
+    """
+    Split text into chunks of at most `max_characters`, breaking between sentences where possible,
+    then between words, and only mid-word for words longer than a chunk
+    """
+    text = text.strip()
+    if len(text) <= max_characters:
+        return [text] if text else []
+
+    chunks = []
+    current = ""
+    for sentence in re.split(r"(?<=[.!?])\s+", text):
+        for piece in _split_long(sentence, max_characters):
+            if current and len(current) + 1 + len(piece) > max_characters:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _split_long(sentence, max_characters):
+    if len(sentence) <= max_characters:
+        return [sentence]
+
+    pieces = []
+    current = ""
+    for word in sentence.split():
+        while len(word) > max_characters:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(word[:max_characters])
+            word = word[max_characters:]
+        if current and len(current) + 1 + len(word) > max_characters:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def is_title(paragraph):
+    """Heuristic for a title line, like Unstructured's: short, single line, and not ending like a sentence"""
+    return (
+        "\n" not in paragraph
+        and len(paragraph) <= 80
+        and len(paragraph.split()) <= 12
+        and not paragraph.endswith((".", ",", ";", ":", "!", "?"))
+    )
+
+
+def chunk_by_title(text, max_characters, combine_under_characters=None):
+    """
+    Split text into chunks of paragraphs of at most `max_characters`, starting a new chunk at a title,
+    like Unstructured's "by_title" chunking strategy. Paragraphs longer than a chunk are split with `split_text`.
+    Like Unstructured's `combine_text_under_n_chars`, sections are combined until the chunk reaches
+    `combine_under_characters` (`max_characters` by default), so that a title only starts a new chunk after that,
+    and short sections like list items aren't left as tiny chunks.
+    """
+    if combine_under_characters is None:
+        combine_under_characters = max_characters
+    chunks = []
+    current = []
+    length = 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        title = is_title(paragraph)
+        # Whitespace within a paragraph is collapsed, like Unstructured's clean_extra_whitespace
+        paragraph = re.sub(r"\s+", " ", paragraph)
+        for piece in split_text(paragraph, max_characters):
+            new_section = title and length >= combine_under_characters
+            if current and (new_section or length + 2 + len(piece) > max_characters):
+                chunks.append("\n\n".join(current))
+                current = []
+                length = 0
+            title = False
+            current.append(piece)
+            length += len(piece) + (2 if length else 0)
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def chunk_rows(header, rows, max_characters):
+    """
+    Split csv rows into chunks of at most `max_characters`, on row boundaries.
+    Cells are joined by spaces, rows by newlines, and the header row starts every chunk.
+    """
+    header_line = " ".join(header)
+    chunks = []
+    current = [header_line] if header_line else []
+    length = len(header_line)
+    has_rows = False
+    for row in rows:
+        line = " ".join(cell.strip() for cell in row if cell.strip())
+        if not line:
+            continue
+        if has_rows and length + 1 + len(line) > max_characters:
+            chunks.append("\n".join(current))
+            current = [header_line] if header_line else []
+            length = len(header_line)
+        current.append(line)
+        length += len(line) + 1
+        has_rows = True
+    if has_rows:
+        chunks.append("\n".join(current))
+    return chunks
@@ -0,0 +1,20 @@
+import os
+import uuid
+
+
+def get_corpus_version(path):
+    """Current version of the stored corpus, which changes on every ingestion write. None if never written."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def bump_corpus_version(path):
+    """Record that the stored corpus changed, invalidating anything derived from it, like cached responses"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp_path, path)
@@ -0,0 +1,220 @@
+import os
+import re
+import sqlite3
+from threading import Lock
+import mmh3
+import numpy as np
+
+
+SHINGLE_WORDS = 3
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_PRIME = np.uint64((1 << 61) - 1)
+
+
+def get_shingles(text):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def get_lsh_bands(threshold, num_perm):
+    """
+    Split signatures into `bands` of `rows` so that chunks above the similarity threshold are
+    very likely to share a band. Picks the most selective split whose LSH threshold, (1/bands)^(1/rows),
+    is still at or below the requested threshold.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+
+class NearDuplicateFilter:
+    """
+    MinHash/LSH filter dropping chunks whose estimated Jaccard similarity (over word shingles)
+    to an already stored chunk is at or above `threshold`.
+
+    Signatures are persisted in SQLite, so chunks are also deduplicated against previous runs.
+    A kept chunk's signature is only persisted once the chunk is stored, see `mark_stored`: until then,
+    it only deduplicates chunks of the same run. Nothing is written when `persist` is False, ex: for dry runs.
+    Chunks from the same source file never count as duplicates of each other, since a re-ingested
+    file replaces its previous chunks.
+    """
+    def __init__(self, path, threshold=0.9, num_perm=128, persist=True):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.persist = persist
+        self.bands, self.rows = get_lsh_bands(threshold, num_perm)
+
+        rng = np.random.RandomState(1)
+        self._a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+        self.checked = 0
+        self.dropped = 0
+        self._uncommitted = 0
+        self._pending = {} # id -> (source, signature, buckets) of kept chunks not stored yet
+        self._pending_buckets = {} # (band, bucket) -> ids
+        self._lock = Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS settings (num_perm INTEGER, bands INTEGER, rows INTEGER)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS signatures (id TEXT PRIMARY KEY, source TEXT, signature BLOB)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS buckets (band INTEGER, bucket INTEGER, id TEXT)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_buckets ON buckets (band, bucket)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_buckets_id ON buckets (id)")
+
+        settings = self._conn.execute("SELECT num_perm, bands, rows FROM settings").fetchone()
+        if settings != (num_perm, self.bands, self.rows):
+            if settings and settings[0] != num_perm:
+                # Signatures aren't comparable across numbers of permutations
+                self._conn.execute("DELETE FROM signatures")
+            # Signatures don't depend on the threshold, only their LSH buckets do
+            self._rebuild_buckets()
+            self._conn.execute("DELETE FROM settings")
+            self._conn.execute("INSERT INTO settings VALUES (?, ?, ?)", (num_perm, self.bands, self.rows))
+        self.commit()
+
+
+    def is_duplicate(self, doc_id, source, text):
+        """
+        Check a chunk against stored signatures, and those of chunks kept earlier in the run.
+        Non-duplicates are kept pending until `mark_stored`.
+        """
+        shingles = get_shingles(text)
+        if not shingles:
+            return False
+        signature = self._minhash(shingles)
+        buckets = self._buckets(signature)
+
+        with self._lock:
+            self.checked += 1
+            if self._find_duplicate(doc_id, source, signature, buckets):
+                self.dropped += 1
+                return True
+
+            self._pending[doc_id] = (source, signature, buckets)
+            for band, bucket in enumerate(buckets):
+                self._pending_buckets.setdefault((band, bucket), set()).add(doc_id)
+        return False
+
+
+    def mark_stored(self, ids):
+        """Persist the signatures of kept chunks once they are stored, so that they deduplicate later runs too"""
+        with self._lock:
+            rows = []
+            for doc_id in ids:
+                entry = self._pop_pending(doc_id)
+                if entry:
+                    rows.append((doc_id, *entry))
+            if not rows:
+                return
+
+            self._conn.executemany("DELETE FROM buckets WHERE id = ?", [(doc_id,) for doc_id, _, _, _ in rows])
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO signatures (id, source, signature) VALUES (?, ?, ?)",
+                [(doc_id, source, signature.tobytes()) for doc_id, source, signature, _ in rows],
+            )
+            self._conn.executemany(
+                "INSERT INTO buckets (band, bucket, id) VALUES (?, ?, ?)",
+                [(band, bucket, doc_id) for doc_id, _, _, buckets in rows for band, bucket in enumerate(buckets)],
+            )
+            self._uncommitted += len(rows)
+            if self._uncommitted >= 1000:
+                self._commit()
+
+
+    def remove(self, ids):
+        ids = list(ids)
+        with self._lock:
+            for doc_id in ids:
+                self._pop_pending(doc_id)
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                self._conn.execute(f"DELETE FROM signatures WHERE id IN ({placeholders})", batch)
+                self._conn.execute(f"DELETE FROM buckets WHERE id IN ({placeholders})", batch)
+            self._commit()
+
+
+    def commit(self):
+        with self._lock:
+            self._commit()
+
+
+    def _commit(self):
+        # Dry runs dedup within the run without writing to the store
+        if self.persist:
+            self._conn.commit()
+        self._uncommitted = 0
+
+
+    def print_report(self):
+        rate = self.dropped / self.checked if self.checked else 0.0
+        print(f"[Dedup] {self.dropped} of {self.checked} chunks dropped as near-duplicates ({rate:.1%}, threshold {self.threshold})")
+
+
+    def _pop_pending(self, doc_id):
+        entry = self._pending.pop(doc_id, None)
+        if entry:
+            for band, bucket in enumerate(entry[2]):
+                self._pending_buckets[(band, bucket)].discard(doc_id)
+        return entry
+
+
+    def _rebuild_buckets(self):
+        self._conn.execute("DELETE FROM buckets")
+        cursor = self._conn.execute("SELECT id, signature FROM signatures")
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            self._conn.executemany(
+                "INSERT INTO buckets (band, bucket, id) VALUES (?, ?, ?)",
+                [
+                    (band, bucket, doc_id)
+                    for doc_id, signature in rows
+                    for band, bucket in enumerate(self._buckets(np.frombuffer(signature, dtype=np.uint32)))
+                ],
+            )
+
+
+    def _minhash(self, shingles):
+        hashes = np.array([mmh3.hash(shingle, signed=False) for shingle in shingles], dtype=np.uint64)
+        permuted = ((hashes[:, None] * self._a + self._b) % _PRIME) & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+    def _buckets(self, signature):
+        return [
+            mmh3.hash(signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+
+    def _find_duplicate(self, doc_id, source, signature, buckets):
+        conditions = " OR ".join("(band = ? AND bucket = ?)" for _ in buckets)
+        params = [value for band, bucket in enumerate(buckets) for value in (band, bucket)]
+        candidates = [
+            (candidate_id, candidate_source, np.frombuffer(candidate_signature, dtype=np.uint32))
+            for candidate_id, candidate_source, candidate_signature in self._conn.execute(
+                f"SELECT DISTINCT s.id, s.source, s.signature FROM buckets b JOIN signatures s ON s.id = b.id WHERE {conditions}",
+                params,
+            )
+        ]
+        pending_ids = set().union(*(self._pending_buckets.get((band, bucket), ()) for band, bucket in enumerate(buckets)))
+        candidates.extend((candidate_id, *self._pending[candidate_id][:2]) for candidate_id in pending_ids)
+
+        for candidate_id, candidate_source, candidate_signature in candidates:
+            if candidate_id == doc_id or candidate_source == source:
+                continue
+            similarity = np.mean(candidate_signature == signature)
+            if similarity >= self.threshold:
+                return True
+        return False
@@ -0,0 +1,84 @@
+import os
+import re
+from email import policy
+from email.parser import BytesParser
+from email.utils import parsedate_to_datetime
+from langchain_core.documents import Document
+
+from .chunkers import split_text
+from .mbox_reader import open_mbox, iter_mbox_spans
+from ..utils.helpers import clean_text, html_to_text
+
+
+def get_part_text(part):
+    try:
+        return part.get_content()
+    except (LookupError, UnicodeDecodeError):
+        # Unknown or wrong charset
+        payload = part.get_payload(decode=True) or b""
+        return payload.decode("utf-8", errors="replace")
+
+
+def get_message_text(message):
+    """
+    Text body of an email of any content type: the first text/plain part,
+    otherwise the first text/html part converted to text. Attachments are ignored.
+    """
+    plain_text = None
+    html = None
+    for part in message.walk():
+        if part.is_multipart() or part.get_content_disposition() == "attachment":
+            continue
+        content_type = part.get_content_type()
+        if content_type == "text/plain" and plain_text is None:
+            plain_text = get_part_text(part)
+        elif content_type == "text/html" and html is None:
+            html = get_part_text(part)
+
+    if plain_text and plain_text.strip():
+        text = plain_text
+    elif html:
+        text = html_to_text(html)
+    else:
+        return ""
+    # clean_text strips newlines outright, so turn them into spaces first to keep words apart
+    return clean_text(re.sub(r"\s+", " ", text))
+
+
+def get_message_date(message):
+    try:
+        return parsedate_to_datetime(message["date"]).isoformat()
+    except (TypeError, ValueError):
+        return message.get("date", "")
+
+
+def iter_mbox_documents(_file_paths, _chunk_max_characters):
+    """
+    Read emails straight from mbox files with the stdlib email parser, and yield chunked documents
+    Metadata mirrors what Unstructured produces for .eml files, so `process_doc` handles both alike
+    """
+    parser = BytesParser(policy=policy.default)
+    for path in _file_paths:
+        mbox = open_mbox(path)
+        try:
+            for start, end in iter_mbox_spans(mbox):
+                # Headers are parsed lazily with policy.default, so malformed ones raise when read
+                try:
+                    message = parser.parsebytes(mbox[start:end])
+                    text = get_message_text(message)
+                    metadata = {
+                        "source": path,
+                        "file_directory": os.path.dirname(path),
+                        "filename": os.path.basename(path),
+                        "sent_from": [str(message.get("from", ""))],
+                        "last_modified": get_message_date(message),
+                        "subject": str(message.get("subject", "")),
+                    }
+                except Exception as e:
+                    print(f"Error parsing email at byte {start} of {path}: {e}. Skipping...")
+                    continue
+
+                for chunk in split_text(text, _chunk_max_characters):
+                    yield Document(page_content=chunk, metadata=dict(metadata))
+        finally:
+            mbox.close()
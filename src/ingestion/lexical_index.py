@@ -0,0 +1,145 @@
+import os
+import re
+import json
+import time
+import sqlite3
+from threading import Lock
+from langchain_core.documents import Document
+
+from ..utils.metadata_filter import get_where_sql
+
+
+# Words too common to help ranking, dropped from queries
+STOPWORDS = {
+    "a", "about", "all", "am", "an", "and", "any", "are", "as", "at", "be", "but", "by", "can", "could", "did", "do",
+    "does", "for", "from", "get", "got", "had", "has", "have", "he", "her", "his", "how", "i", "if", "in", "is", "it",
+    "its", "me", "my", "of", "on", "or", "our", "she", "so", "that", "the", "their", "them", "there", "they", "this",
+    "to", "was", "we", "were", "what", "when", "where", "which", "who", "why", "will", "with", "would", "you", "your",
+}
+# SQLite VM instructions between latency budget checks
+PROGRESS_HANDLER_INSTRUCTIONS = 1000
+
+
+def build_match_query(text):
+    """
+    FTS5 query matching any of the words of a prompt, ex: 'what is Sam's number?' -> '"sam" OR "number"'.
+    Every word is quoted so that FTS5 operators and punctuation in prompts are matched literally.
+    """
+    words = []
+    for word in re.findall(r"\w+", text.lower()):
+        if (len(word) > 1 or word.isdigit()) and word not in STOPWORDS and word not in words:
+            words.append(word)
+    return " OR ".join(f'"{word}"' for word in words)
+
+
+class LexicalIndex:
+    """
+    SQLite FTS5 inverted index of the chunks stored in the Chroma collection, ranked with BM25.
+    Matches exact terms the embeddings blur, like names, phone numbers, and rare words.
+
+    Kept in sync with the collection by BatchedEmbeddingWriter and `delete_chunks` during ingestion.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (rowid INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, page_content TEXT, metadata TEXT)"
+        )
+        # External content table: the text is stored once, in `chunks`, and the triggers keep the inverted index in sync
+        self._conn.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                page_content, content='chunks', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+                INSERT INTO chunks_fts (rowid, page_content) VALUES (new.rowid, new.page_content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+                INSERT INTO chunks_fts (chunks_fts, rowid, page_content) VALUES ('delete', old.rowid, old.page_content);
+            END;
+        """)
+        self._conn.commit()
+
+
+    def upsert(self, ids, texts, metadatas):
+        with self._lock:
+            self._delete(ids)
+            self._conn.executemany(
+                "INSERT INTO chunks (id, page_content, metadata) VALUES (?, ?, ?)",
+                [(doc_id, text, json.dumps(metadata or {})) for doc_id, text, metadata in zip(ids, texts, metadatas)],
+            )
+            self._conn.commit()
+
+
+    def update_metadata(self, ids, metadatas):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE chunks SET metadata = ? WHERE id = ?",
+                [(json.dumps(metadata or {}), doc_id) for doc_id, metadata in zip(ids, metadatas)],
+            )
+            self._conn.commit()
+
+
+    def delete(self, ids):
+        with self._lock:
+            self._delete(ids)
+            self._conn.commit()
+
+
+    def _delete(self, ids):
+        self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(doc_id,) for doc_id in ids])
+
+
+    def search(self, query, k, budget_ms=None, where=None, where_document=None):
+        """
+        Top `k` chunks matching the words of `query`, best BM25 score first.
+        Results are restricted by Chroma style `where` & `where_document` filters, if given.
+        The search is aborted when it runs longer than `budget_ms`, returning no results, so that
+        lexical retrieval never holds up a response.
+        """
+        match_query = build_match_query(query)
+        if not match_query:
+            return []
+        where_sql, where_params = get_where_sql(where, where_document, "chunks.metadata", "chunks.page_content")
+
+        with self._lock:
+            if budget_ms:
+                deadline = time.perf_counter() + budget_ms / 1000
+                self._conn.set_progress_handler(lambda: time.perf_counter() > deadline, PROGRESS_HANDLER_INSTRUCTIONS)
+            try:
+                rows = self._conn.execute(
+                    "SELECT chunks.id, chunks.page_content, chunks.metadata FROM chunks_fts "
+                    "JOIN chunks ON chunks.rowid = chunks_fts.rowid "
+                    f"WHERE chunks_fts MATCH ? AND {where_sql} ORDER BY bm25(chunks_fts) LIMIT ?",
+                    (match_query, *where_params, k),
+                ).fetchall()
+            except sqlite3.OperationalError as e:
+                if "interrupted" not in str(e):
+                    raise
+                print(f"[Lexical Index] Search exceeded its {budget_ms}ms budget. Skipping...")
+                return []
+            finally:
+                if budget_ms:
+                    self._conn.set_progress_handler(None, 0)
+
+        return [
+            Document(id=doc_id, page_content=page_content, metadata=json.loads(metadata or "{}"))
+            for doc_id, page_content, metadata in rows
+        ]
+
+
+    def ids(self):
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT id FROM chunks")}
+
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,128 @@
+import os
+import json
+import hashlib
+
+
+def hash_file(path, block_size=1 << 20):
+    """sha256 of a file's contents, read in blocks"""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def source_key(path):
+    """Manifest key of a source: the absolute path of a file, or the URI of a source which isn't a file"""
+    return path if "://" in path else os.path.abspath(path)
+
+
+def make_chunk_id(source, content):
+    """Deterministic chunk ID from the chunk's source path and content hash"""
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{source}\0{content_hash}".encode("utf-8")).hexdigest()
+
+
+class ManifestDiff:
+    def __init__(self):
+        self.changed = {} # path -> sha256, for new or modified files
+        self.unchanged = []
+        self.deleted = []
+
+
+class IngestManifest:
+    """
+    Persisted record of ingested files: mtime, size, content hash, and the IDs of the chunks stored for each file.
+    Used to skip unchanged files, upsert changed ones, and remove chunks of deleted files.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f)
+        os.replace(tmp_path, self.path)
+
+
+    def diff(self, file_paths, folder_path, file_type, force=False):
+        """
+        Compare files on disk against the manifest, for files of `file_type` under `folder_path`
+        With `force`, every file on disk is treated as changed
+        """
+        result = ManifestDiff()
+        seen = set()
+
+        for path in file_paths:
+            key = os.path.abspath(path)
+            seen.add(key)
+            stats = os.stat(path)
+            entry = None if force else self.files.get(key)
+
+            # Cheap check first: an untouched file keeps its mtime & size
+            if entry and entry["mtime"] == stats.st_mtime and entry["size"] == stats.st_size:
+                result.unchanged.append(path)
+                continue
+
+            sha = hash_file(path)
+            if entry and entry["sha256"] == sha:
+                entry["mtime"] = stats.st_mtime
+                entry["size"] = stats.st_size
+                result.unchanged.append(path)
+            else:
+                result.changed[path] = sha
+
+        scope = os.path.abspath(folder_path) + os.sep
+        for key in self.files:
+            if key.startswith(scope) and key.endswith(f".{file_type}") and key not in seen:
+                result.deleted.append(key)
+
+        return result
+
+
+    def diff_sources(self, versions, prefix, force=False):
+        """
+        Like `diff`, for sources which aren't files, such as chats of the message store.
+        `versions` maps each source URI starting with `prefix` to a string which changes with its contents.
+        """
+        result = ManifestDiff()
+        for source, version in versions.items():
+            entry = None if force else self.files.get(source)
+            if entry and entry["sha256"] == version:
+                result.unchanged.append(source)
+            else:
+                result.changed[source] = version
+
+        for key in self.files:
+            if key.startswith(prefix) and key not in versions:
+                result.deleted.append(key)
+
+        return result
+
+
+    def chunk_ids(self, path):
+        entry = self.files.get(source_key(path))
+        return set(entry["chunk_ids"]) if entry else set()
+
+
+    def record(self, path, sha256, chunk_ids, mtime=None, size=None):
+        # Sources which aren't files have no mtime or size
+        if (mtime is None or size is None) and os.path.isfile(path):
+            stats = os.stat(path)
+            mtime, size = stats.st_mtime, stats.st_size
+        self.files[source_key(path)] = {
+            "mtime": mtime,
+            "size": size,
+            "sha256": sha256,
+            "chunk_ids": sorted(chunk_ids),
+        }
+
+
+    def remove(self, path):
+        self.files.pop(source_key(path), None)
@@ -0,0 +1,41 @@
+import mmap
+from email.parser import BytesHeaderParser
+
+
+def open_mbox(path):
+    """Memory-map an mbox file for reading"""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def iter_mbox_spans(mm):
+    """
+    Yield (start, end) byte offsets of each message in a memory-mapped mbox, in a single pass.
+    Messages are delimited by lines starting with "From ", the same rule `mailbox.mbox` uses.
+    The span excludes the "From " separator line itself.
+    """
+    size = len(mm)
+    if mm[:5] == b"From ":
+        pos = 0
+    else:
+        separator = mm.find(b"\nFrom ")
+        if separator == -1:
+            return
+        pos = separator + 1
+
+    while pos < size:
+        next_separator = mm.find(b"\nFrom ", pos)
+        end = next_separator + 1 if next_separator != -1 else size
+        header_start = mm.find(b"\n", pos, end) + 1 or end
+        yield header_start, end
+        pos = end
+
+
+def parse_headers(message_bytes):
+    """Parse only the headers of a raw message, without building the message body"""
+    header_end = message_bytes.find(b"\n\n")
+    crlf_header_end = message_bytes.find(b"\r\n\r\n")
+    if crlf_header_end != -1 and (header_end == -1 or crlf_header_end < header_end):
+        header_end = crlf_header_end
+    headers = message_bytes[:header_end] if header_end != -1 else message_bytes
+    return BytesHeaderParser().parsebytes(headers)
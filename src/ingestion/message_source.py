@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from langchain_core.documents import Document
+
+from .message_store import MessageStore, format_message
+
+
+MESSAGE_SOURCE_PREFIX = "imessage://chat/"
+WINDOW_MAX_GAP = timedelta(minutes=30)
+WINDOW_MAX_MESSAGES = 20
+
+
+def get_message_source(chat_id):
+    return f"{MESSAGE_SOURCE_PREFIX}{chat_id}"
+
+
+def get_chat_id(source):
+    return source[len(MESSAGE_SOURCE_PREFIX):]
+
+
+def iter_message_windows(messages, max_characters, max_gap=WINDOW_MAX_GAP, max_messages=WINDOW_MAX_MESSAGES):
+    """
+    Split a chat's chronological messages into non-overlapping windows.
+    A new window starts after a gap longer than `max_gap` between messages,
+    or once a window reaches `max_messages` or `max_characters` of transcript.
+    """
+    window = []
+    characters = 0
+    previous_date = None
+    for message in messages:
+        date = datetime.fromisoformat(message["date"])
+        line_length = len(format_message(message)) + 1
+        if window and (
+            date - previous_date > max_gap
+            or len(window) >= max_messages
+            or characters + line_length > max_characters
+        ):
+            yield window
+            window = []
+            characters = 0
+        window.append(message)
+        characters += line_length
+        previous_date = date
+    if window:
+        yield window
+
+
+def iter_message_documents(_sources, _store_path, _chunk_max_characters):
+    """
+    Yield a document per message window of each chat source, see `get_message_source`
+    The window's first & last ROWIDs are kept in metadata, to expand it from the message store at query time
+    """
+    store = MessageStore(_store_path)
+    try:
+        for source in _sources:
+            chat_id = get_chat_id(source)
+            for window in iter_message_windows(store.iter_chat(chat_id), _chunk_max_characters):
+                participants = sorted({
+                    person for message in window for person in (message["sender"], message["recipient"])
+                    if person and person != "me"
+                })
+                metadata = {
+                    "source": source,
+                    "chat_id": chat_id,
+                    "chat_name": window[0]["chat_name"] or "",
+                    "participants": ", ".join(participants),
+                    "first_rowid": window[0]["rowid"],
+                    "last_rowid": window[-1]["rowid"],
+                    "last_modified": window[-1]["date"],
+                }
+                yield Document(
+                    page_content="\n".join(format_message(message) for message in window),
+                    metadata=metadata,
+                )
+    finally:
+        store.close()
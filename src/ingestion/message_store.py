@@ -0,0 +1,117 @@
+import os
+import sqlite3
+from threading import Lock
+
+
+MESSAGE_COLUMNS = ["rowid", "chat_id", "chat_name", "date", "sender", "recipient", "text"]
+
+
+def format_message(message):
+    """One transcript line per message, ex: '2024-01-02 10:15 me: sounds good'"""
+    return f"{message['date'][:16]} {message['sender'] or 'unknown'}: {message['text']}"
+
+
+class MessageStore:
+    """
+    Local SQLite copy of iMessages, keyed by the chat.db message ROWID and indexed by chat & date.
+
+    Messages are stored once. Embeddings are computed over windows of a chat's messages,
+    and retrieved windows are expanded to their neighbouring messages from the store at query time.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "rowid INTEGER PRIMARY KEY, chat_id TEXT NOT NULL, chat_name TEXT, date TEXT NOT NULL, "
+            "sender TEXT, recipient TEXT, text TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_chat_date ON messages (chat_id, date, rowid)")
+        self._conn.commit()
+
+
+    def upsert(self, rows):
+        """Insert or replace messages, given as tuples in MESSAGE_COLUMNS order"""
+        placeholders = ",".join("?" * len(MESSAGE_COLUMNS))
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO messages ({','.join(MESSAGE_COLUMNS)}) VALUES ({placeholders})",
+                rows,
+            )
+            self._conn.commit()
+
+
+    def last_rowid(self):
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM messages").fetchone()[0]
+
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+
+    def chat_versions(self):
+        """
+        Version string of each chat's messages, which changes when messages are added, removed, or edited.
+        Used to only re-window chats which changed since they were last embedded.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chat_id, COUNT(*), MAX(rowid), SUM(LENGTH(COALESCE(text, ''))) FROM messages GROUP BY chat_id"
+            ).fetchall()
+        return {chat_id: f"{count}-{max_rowid}-{length}" for chat_id, count, max_rowid, length in rows}
+
+
+    def iter_chat(self, chat_id):
+        """Messages with text of a chat, in chronological order"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM messages WHERE chat_id = ? AND text IS NOT NULL AND text != '' ORDER BY date, rowid",
+                (chat_id,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+    def get_context(self, chat_id, first_rowid, last_rowid, neighbours):
+        """
+        Messages of a window, from `first_rowid` to `last_rowid`,
+        plus up to `neighbours` messages of the same chat before and after it
+        """
+        with self._lock:
+            bounds = self._conn.execute(
+                "SELECT rowid, date FROM messages WHERE rowid IN (?, ?)",
+                (first_rowid, last_rowid),
+            ).fetchall()
+            dates = {row["rowid"]: row["date"] for row in bounds}
+            if first_rowid not in dates or last_rowid not in dates:
+                return []
+
+            first = (dates[first_rowid], first_rowid)
+            last = (dates[last_rowid], last_rowid)
+            has_text = "text IS NOT NULL AND text != ''"
+            before = self._conn.execute(
+                f"SELECT * FROM messages WHERE chat_id = ? AND {has_text} AND (date, rowid) < (?, ?) "
+                "ORDER BY date DESC, rowid DESC LIMIT ?",
+                (chat_id, *first, neighbours),
+            ).fetchall()
+            window = self._conn.execute(
+                f"SELECT * FROM messages WHERE chat_id = ? AND {has_text} AND (date, rowid) >= (?, ?) AND (date, rowid) <= (?, ?) "
+                "ORDER BY date, rowid",
+                (chat_id, *first, *last),
+            ).fetchall()
+            after = self._conn.execute(
+                f"SELECT * FROM messages WHERE chat_id = ? AND {has_text} AND (date, rowid) > (?, ?) "
+                "ORDER BY date, rowid LIMIT ?",
+                (chat_id, *last, neighbours),
+            ).fetchall()
+        return [dict(row) for row in [*reversed(before), *window, *after]]
+
+
+    def close(self):
+        self._conn.close()
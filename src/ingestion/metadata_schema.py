@@ -0,0 +1,53 @@
+"""
+Metadata fields every chunk has, whatever its source:
+- type: data type, ex: 'apple/notes', 'google/gmail'
+- source: kind of source the chunk was ingested from: 'txt', 'csv', 'eml', 'mbox', 'zip' or 'imessage'
+- source_id: manifest key of the source, the absolute path of a file or the URI of a chat
+- ts: epoch seconds of the chunk's date, for range filters. Missing if the source has no date
+- last_modified: ISO date for display, from the source or else from `ts`
+"""
+import os
+from datetime import datetime
+
+from ..utils.helpers import get_timestamp
+
+
+SOURCE_KINDS = ("txt", "csv", "eml", "mbox", "zip", "imessage")
+
+
+def get_schema_metadata(source, source_id, date):
+    """Shared metadata fields of a chunk, `date` being anything `get_timestamp` parses"""
+    metadata = {"source": source, "source_id": source_id}
+    ts = get_timestamp(date)
+    if ts is not None:
+        metadata["ts"] = ts
+        metadata["last_modified"] = datetime.fromtimestamp(ts).date().isoformat()
+    return metadata
+
+
+def get_source_kind(source_id, metadata):
+    """Source kind of a chunk stored before the schema, from its manifest key, or else its metadata"""
+    if source_id:
+        if source_id.startswith("imessage://"):
+            return "imessage"
+        extension = os.path.splitext(source_id)[1].lstrip(".").lower()
+        if extension in SOURCE_KINDS:
+            return extension
+    if "chat_id" in metadata:
+        return "imessage"
+    if "subject" in metadata or "sent_from" in metadata:
+        return "eml"
+    if "created_at" in metadata or "updated_at" in metadata:
+        return "txt"
+    if "filename" in metadata:
+        return "zip"
+    return "csv"
+
+
+def migrate_metadata(metadata, source_id=None):
+    """Metadata of a chunk stored before the schema, with its shared fields added"""
+    if "ts" in metadata and "source_id" in metadata:
+        return metadata
+    date = metadata.get("ts") or metadata.get("last_modified") or metadata.get("updated_at") or metadata.get("created_at")
+    schema_metadata = get_schema_metadata(get_source_kind(source_id, metadata), source_id or "", date)
+    return {**schema_metadata, **metadata}
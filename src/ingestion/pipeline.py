@@ -0,0 +1,41 @@
+from queue import Queue
+from threading import Thread
+
+
+_DONE = object()
+
+
+class _ProducerError:
+    def __init__(self, error):
+        self.error = error
+
+
+def prefetch(iterable, maxsize=256):
+    """
+    Consume `iterable` on a background thread, buffering at most `maxsize` items.
+    The producer blocks while the buffer is full, so a slow consumer applies backpressure
+    to the producer instead of the whole iterable being materialized in memory.
+    """
+    queue = Queue(maxsize=maxsize)
+
+    def produce():
+        try:
+            for item in iterable:
+                queue.put(item)
+        except Exception as e:
+            queue.put(_ProducerError(e))
+        finally:
+            queue.put(_DONE)
+
+    thread = Thread(target=produce, daemon=True)
+    thread.start()
+
+    while True:
+        item = queue.get()
+        if item is _DONE:
+            break
+        if isinstance(item, _ProducerError):
+            raise item.error
+        yield item
+
+    thread.join()
@@ -0,0 +1,119 @@
+import time
+from bisect import bisect_right
+from contextlib import contextmanager
+from threading import Lock
+
+import tiktoken
+
+
+# Together.ai pricing for BAAI/bge-large-en-v1.5
+EMBEDDING_PRICE_PER_MILLION_TOKENS = 0.02
+# Used to estimate embedding duration when nothing has been embedded yet (dry runs)
+ESTIMATED_SECONDS_PER_BATCH = 1.0
+# bge-large truncates inputs longer than this
+EMBEDDING_MAX_TOKENS = 512
+
+CHARACTER_BUCKETS = [250, 500, 1000, 1500, 2000, 4000]
+TOKEN_BUCKETS = [64, 128, 256, 512, 1024]
+
+
+class StageProfiler:
+    """
+    Accumulates wall time and item counts per ingestion stage, and the size distribution of chunks
+    Token counts use tiktoken's cl100k_base encoding, an approximation of bge's tokenizer
+    """
+    def __init__(self):
+        self.stages = {} # name -> [seconds, items]
+        self.chunk_characters = []
+        self.chunk_tokens = []
+        self.start_time = time.perf_counter()
+        self._encoding = tiktoken.get_encoding("cl100k_base")
+        self._lock = Lock()
+
+
+    def add(self, name, seconds, items=1):
+        with self._lock:
+            stage = self.stages.setdefault(name, [0.0, 0])
+            stage[0] += seconds
+            stage[1] += items
+
+
+    def merge(self, stages):
+        """Merge stage timings collected by another profiler, e.g. in a worker process"""
+        for name, (seconds, items) in stages.items():
+            self.add(name, seconds, items)
+
+
+    @contextmanager
+    def stage(self, name, items=1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, items)
+
+
+    def wrap(self, name, iterable):
+        """Time how long `iterable` takes to produce each item"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - start, 0)
+                return
+            self.add(name, time.perf_counter() - start)
+            yield item
+
+
+    def record_chunk(self, text):
+        self.chunk_characters.append(len(text))
+        self.chunk_tokens.append(len(self._encoding.encode(text, disallowed_special=())))
+
+
+    def print_report(self, batch_size, max_concurrency, workers=1):
+        elapsed = time.perf_counter() - self.start_time
+        print(f"\n[Profile] Total wall time: {elapsed:.1f}s")
+        if workers > 1:
+            print(f"[Profile] Parsing stages are summed across {workers} worker processes")
+        print(f"[Profile] {'stage':<16}{'seconds':>10}{'items':>10}{'items/s':>12}")
+        for name, (seconds, items) in self.stages.items():
+            rate = items / seconds if seconds else 0.0
+            print(f"[Profile] {name:<16}{seconds:>10.2f}{items:>10}{rate:>12.1f}")
+
+        chunks = len(self.chunk_tokens)
+        total_tokens = sum(self.chunk_tokens)
+        print(f"\n[Profile] Chunks: {chunks}, characters: {sum(self.chunk_characters)}, tokens: {total_tokens}")
+        self._print_histogram("characters per chunk", self.chunk_characters, CHARACTER_BUCKETS)
+        self._print_histogram("tokens per chunk", self.chunk_tokens, TOKEN_BUCKETS)
+        truncated = sum(1 for tokens in self.chunk_tokens if tokens > EMBEDDING_MAX_TOKENS)
+        if truncated:
+            print(f"[Profile] {truncated} chunks exceed {EMBEDDING_MAX_TOKENS} tokens and will be truncated by the embedding model")
+
+        cost = total_tokens / 1_000_000 * EMBEDDING_PRICE_PER_MILLION_TOKENS
+        batches = -(-chunks // batch_size)
+        embed_seconds, embedded = self.stages.get("embed", [0.0, 0])
+        if embedded:
+            # Embedding runs concurrently, so wall time is roughly the summed request time over the concurrency
+            duration = embed_seconds / embedded * chunks / max_concurrency
+        else:
+            duration = batches / max_concurrency * ESTIMATED_SECONDS_PER_BATCH
+        print(f"[Profile] Estimated embedding cost: ${cost:.4f}, duration: {duration:.1f}s ({batches} batches of {batch_size}, concurrency {max_concurrency})")
+
+
+    def _print_histogram(self, title, values, buckets):
+        if not values:
+            return
+        counts = [0] * (len(buckets) + 1)
+        for value in values:
+            counts[bisect_right(buckets, value)] += 1
+
+        print(f"[Profile] Histogram of {title}:")
+        lower = 0
+        largest = max(counts)
+        for upper, count in zip(buckets + [None], counts):
+            label = f"{lower}-{upper - 1}" if upper else f"{lower}+"
+            bar = "#" * round(40 * count / largest) if largest else ""
+            print(f"[Profile]   {label:>12} {count:>8} {bar}")
+            lower = upper
@@ -0,0 +1,48 @@
+import os
+import csv
+from datetime import datetime
+from langchain_core.documents import Document
+
+from .chunkers import chunk_by_title, chunk_rows
+
+
+def get_file_source_metadata(path):
+    """Metadata Unstructured sets on the documents of a file, which `process_doc` relies on"""
+    return {
+        "source": path,
+        "file_directory": os.path.dirname(path),
+        "filename": os.path.basename(path),
+        "last_modified": datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def iter_txt_documents(_file_paths, _chunk_max_characters):
+    """Chunk plain text files natively, on title & paragraph boundaries, without Unstructured"""
+    for path in _file_paths:
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except OSError as e:
+            print(f"Error reading {path}: {e}. Skipping...")
+            continue
+
+        metadata = get_file_source_metadata(path)
+        for chunk in chunk_by_title(text, _chunk_max_characters):
+            yield Document(page_content=chunk, metadata=dict(metadata))
+
+
+def iter_csv_documents(_file_paths, _chunk_max_characters):
+    """Chunk csv files natively, on row boundaries, without Unstructured"""
+    for path in _file_paths:
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+                reader = csv.reader(f)
+                header = next(reader, [])
+                chunks = chunk_rows(header, reader, _chunk_max_characters)
+        except (OSError, csv.Error) as e:
+            print(f"Error reading {path}: {e}. Skipping...")
+            continue
+
+        metadata = get_file_source_metadata(path)
+        for chunk in chunks:
+            yield Document(page_content=chunk, metadata=dict(metadata))
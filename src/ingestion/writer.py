@@ -0,0 +1,133 @@
+import time
+import uuid
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from .corpus_version import bump_corpus_version
+
+
+class BatchedEmbeddingWriter:
+    """
+    Embeds documents in batches, with up to `max_concurrency` embedding requests in flight,
+    and bulk inserts each embedded batch into the Chroma collection.
+
+    A failing batch is retried with backoff, then split in half until the failing
+    document is isolated. Other batches are unaffected.
+    If `corpus_version_path` is given, the corpus version is bumped after each stored batch.
+    If `lexical_index` is given, stored batches are also indexed in it.
+    """
+    def __init__(self, vectorstore, embedding_function, batch_size=64, max_concurrency=4, max_retries=3, retry_delay=2.0, on_batch_committed=None, profiler=None, corpus_version_path=None, lexical_index=None):
+        self.vectorstore = vectorstore
+        self.embedding_function = embedding_function
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.on_batch_committed = on_batch_committed
+        self.profiler = profiler
+        self.corpus_version_path = corpus_version_path
+        self.lexical_index = lexical_index
+
+        self.written = 0
+        self.failed = 0
+        self.failed_ids = set()
+        self.elapsed = 0.0
+        self._lock = Lock()
+
+
+    def write(self, documents):
+        """Embed and store an iterable of documents"""
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            pending = set()
+            for batch in self._batched(documents):
+                # Bound the number of queued batches so documents aren't buffered faster than they are embedded
+                if len(pending) >= self.max_concurrency * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._collect(done)
+                pending.add(executor.submit(self._write_batch, batch, self.max_retries))
+
+            done, _ = wait(pending)
+            self._collect(done)
+
+        self.elapsed += time.perf_counter() - start
+
+
+    def print_report(self):
+        rate = self.written / self.elapsed if self.elapsed else 0.0
+        print(f"[Writer] {self.written} documents written, {self.failed} failed in {self.elapsed:.1f}s ({rate:.1f} docs/s)")
+
+
+    def _batched(self, documents):
+        batch = []
+        for doc in documents:
+            batch.append(doc)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+    def _collect(self, futures):
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"[Writer] Unexpected error writing batch: {e}")
+
+
+    def _write_batch(self, batch, attempts):
+        last_error = None
+        for attempt in range(attempts):
+            try:
+                self._embed_and_store(batch)
+                with self._lock:
+                    self.written += len(batch)
+                return
+            except Exception as e:
+                last_error = e
+                print(f"[Writer] Batch of {len(batch)} documents failed (attempt {attempt + 1}/{attempts}): {e}")
+                if attempt + 1 < attempts:
+                    time.sleep(self.retry_delay * 2 ** attempt)
+
+        if len(batch) == 1:
+            print(f"[Writer] Error embedding doc: {last_error}. Skipping...")
+            with self._lock:
+                self.failed += 1
+                if batch[0].id:
+                    self.failed_ids.add(batch[0].id)
+            return
+
+        # Split to isolate the failing document(s). Halves get a single attempt each.
+        mid = len(batch) // 2
+        self._write_batch(batch[:mid], 1)
+        self._write_batch(batch[mid:], 1)
+
+
+    def _embed_and_store(self, batch):
+        texts = [doc.page_content for doc in batch]
+        start = time.perf_counter()
+        embeddings = self.embedding_function.embed_documents(texts)
+        if self.profiler:
+            self.profiler.add("embed", time.perf_counter() - start, len(batch))
+
+        ids = [doc.id or str(uuid.uuid4()) for doc in batch]
+        metadatas = [doc.metadata for doc in batch]
+        with self._lock:
+            start = time.perf_counter()
+            self.vectorstore._collection.upsert(
+                ids=ids,
+                embeddings=embeddings,
+                metadatas=metadatas,
+                documents=texts,
+            )
+            if self.lexical_index:
+                self.lexical_index.upsert(ids, texts, metadatas)
+            if self.profiler:
+                self.profiler.add("write", time.perf_counter() - start, len(batch))
+            if self.corpus_version_path:
+                bump_corpus_version(self.corpus_version_path)
+        if self.on_batch_committed:
+            self.on_batch_committed(ids)
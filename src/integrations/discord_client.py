@@ -1,7 +1,15 @@
+import time
 import discord
 
-from ..ai.chat import process_message
+from ..ai.chat import stream_message
 from ..utils.constants import DISCORD_APP_ID
+from ..utils.helpers import split_message_text
+
+
+DISCORD_PLACEHOLDER = "…"
+# Discord rate limits message edits, so a streamed completion is edited in at most once per interval
+DISCORD_EDIT_INTERVAL_SECONDS = 1.0
+DISCORD_MESSAGE_MAX_CHARACTERS = 2000
 
 
 class DiscordClient(discord.Client):
@@ -14,9 +22,40 @@ class DiscordClient(discord.Client):
 
         print(f"[Discord] Message received from {message.author}")
 
-        completion = await process_message(message.content)
+        # Reply with a placeholder right away, then edit it as the completion streams in.
+        # Once a message is complete, reply is None until there is more text to continue the completion in a new one
+        reply = await message.channel.send(DISCORD_PLACEHOLDER)
+        text = ""
+        last_edit = time.monotonic()
+        try:
+            async for content in stream_message(message.content):
+                text += content
+                if not reply:
+                    text = text.lstrip()
+                if len(text) > DISCORD_MESSAGE_MAX_CHARACTERS:
+                    # Complete this message, and continue the completion in new ones. A single chunk, like a cached
+                    # response, can span several messages
+                    messages, text = split_message_text(text, DISCORD_MESSAGE_MAX_CHARACTERS)
+                    for head in messages:
+                        if reply:
+                            await reply.edit(content=head)
+                        else:
+                            await message.channel.send(head)
+                        reply = None
+                    if text:
+                        reply = await message.channel.send(text)
+                    last_edit = time.monotonic()
+                elif not reply and text:
+                    reply = await message.channel.send(text)
+                    last_edit = time.monotonic()
+                elif reply and time.monotonic() - last_edit >= DISCORD_EDIT_INTERVAL_SECONDS and text.strip():
+                    await reply.edit(content=text)
+                    last_edit = time.monotonic()
+        except Exception as e:
+            print(f"[Discord] Error streaming completion: {e}")
 
-        await message.channel.send(completion)
+        if reply:
+            await reply.edit(content=text if text.strip() else "Encountered error processing message")
 
 
 intents = discord.Intents.default()
@@ -7,9 +7,8 @@ from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from google_auth_oauthlib.flow import InstalledAppFlow
-from bs4 import BeautifulSoup
 from ..utils.constants import GOOGLE_OAUTH_SCOPES
-from ..utils.helpers import clean_text
+from ..utils.helpers import clean_text, html_to_text
 
 
 class GmailService:
@@ -136,8 +135,7 @@ class GmailService:
                 if part["mimeType"] == "text/html":
                     if "data" in part["body"]:
                         html_body = base64.urlsafe_b64decode(part["body"]["data"]).decode("utf-8")
-                        soup = BeautifulSoup(html_body, 'html.parser')
-                        body = soup.get_text()
+                        body = html_to_text(html_body)
                         break
                 elif part["mimeType"] == "text/plain":
                     if "data" in part["body"]:
@@ -147,8 +145,7 @@ class GmailService:
             # Single part message
             if payload["mimeType"] == "text/html" and "data" in payload["body"]:
                 html_body = base64.urlsafe_b64decode(payload["body"]["data"]).decode("utf-8")
-                soup = BeautifulSoup(html_body, 'html.parser')
-                body = soup.get_text()
+                body = html_to_text(html_body)
             elif payload["mimeType"] == "text/plain" and "data" in payload["body"]:
                 body = base64.urlsafe_b64decode(payload["body"]["data"]).decode("utf-8")
         
@@ -1,10 +1,14 @@
 import requests
 import os
+import json
+import asyncio
 
 from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from ..ai.rag_engine import respond_with_retrieved_context
+from ..ai.rag_engine import arespond_with_retrieved_context, astream_with_retrieved_context, get_rag_stats
+from ..utils.messaging import abatch_sentences
 from ..utils.constants import MEMEX_MESSAGE_MARKER
 
 
@@ -20,41 +24,78 @@ class CompletionRequest(BaseModel):
 
 
 @router.post("/api/v1/completion")
-def generate_completion(data: CompletionRequest, request: Request):
+async def generate_completion(data: CompletionRequest, request: Request):
     client_ip = request.client.host
     if client_ip != "127.0.0.1" or os.environ.get("ENABLE_REST_API") != "true":
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    return respond_with_retrieved_context(data.prompt)
+    return await arespond_with_retrieved_context(data.prompt)
+
+
+@router.post("/api/v1/completion/stream")
+async def stream_completion(data: CompletionRequest, request: Request):
+    """
+    Server-Sent Events variant of /api/v1/completion: a `data` event per generated chunk, JSON encoded,
+    then a `done` event. Errors after the stream started are sent as an `error` event.
+    """
+    client_ip = request.client.host
+    if client_ip != "127.0.0.1" or os.environ.get("ENABLE_REST_API") != "true":
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    async def events():
+        try:
+            async for content in astream_with_retrieved_context(data.prompt):
+                yield f"data: {json.dumps(content)}\n\n"
+        except Exception as e:
+            print(f"[API] Error streaming completion: {e}")
+            yield f"event: error\ndata: {json.dumps('Encountered error generating completion')}\n\n"
+            return
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/api/v1/stats")
+def get_stats(request: Request):
+    client_ip = request.client.host
+    if client_ip != "127.0.0.1" or os.environ.get("ENABLE_REST_API") != "true":
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    return get_rag_stats()
 
 
 @router.post("/api/v1/completion/imessage")
-def send_imessaage(data: CompletionRequest, request: Request):
+async def send_imessaage(data: CompletionRequest, request: Request):
     client_ip = request.client.host
     if client_ip != "127.0.0.1" or os.environ.get("ENABLE_REST_API") != "true":
         raise HTTPException(status_code=403, detail="Forbidden")
     
-    completion = respond_with_retrieved_context(data.prompt)
-
     headers = {
         "Content-Type": "application/json",
     }
     params = {
         "token": BLUEBUBBLES_TOKEN,
     }
-    payload = {
-        "addresses": [IMESSAGE_RECIPIENT],
-        "message": completion + MEMEX_MESSAGE_MARKER,
-    }
 
     try:
-        res = requests.post(
-            f"{BLUEBUBBLES_URL}/api/v1/chat/new",
-            headers=headers, params=params, json=payload
-        )
-
-        if res.status_code != 200:
-            raise HTTPException(status_code=500, detail="Sending iMessage failed. Please ensure the messaging server is running.")
+        # Sentences are sent as they are generated, rather than once the whole completion is done
+        async for batch in abatch_sentences(astream_with_retrieved_context(data.prompt)):
+            payload = {
+                "addresses": [IMESSAGE_RECIPIENT],
+                "message": batch + MEMEX_MESSAGE_MARKER,
+            }
+            res = await asyncio.to_thread(
+                requests.post,
+                f"{BLUEBUBBLES_URL}/api/v1/chat/new",
+                headers=headers, params=params, json=payload
+            )
+
+            if res.status_code != 200:
+                raise HTTPException(status_code=500, detail="Sending iMessage failed. Please ensure the messaging server is running.")
         
         return {
             "status": 200,
@@ -1,8 +1,9 @@
+import asyncio
 import requests
 import socketio
-from fastapi import HTTPException
 
-from ..ai.rag_engine import respond_with_retrieved_context
+from ..ai.rag_engine import astream_with_retrieved_context
+from ..utils.messaging import send_imessage, abatch_sentences
 from ..utils.constants import (
     MEMEX_MESSAGE_MARKER,
     BLUEBUBBLES_HTTP_URL,
@@ -26,6 +27,8 @@ def test_socketio_handshake():
 
 
 sio = socketio.AsyncClient()
+# References to in-flight replies, so they aren't garbage collected before completing
+reply_tasks = set()
 
 @sio.event
 async def connect():
@@ -63,29 +66,20 @@ async def handle_incoming_message(data):
         else:
             return
     
-    completion = respond_with_retrieved_context(parsed_data["message"])
+    # Reply in the background, so other messages & socket events are handled meanwhile
+    task = asyncio.create_task(reply_to_message(parsed_data["message"]))
+    reply_tasks.add(task)
+    task.add_done_callback(reply_tasks.discard)
 
-    try:
-        res = requests.post(
-            f"{BLUEBUBBLES_HTTP_URL}/api/v1/chat/new",
-            headers={
-                "Content-Type": "application/json",
-            },
-            params={
-                "token": BLUEBUBBLES_TOKEN,
-            },
-            json={
-                "addresses": [IMESSAGE_RECIPIENT],
-                "message": completion + MEMEX_MESSAGE_MARKER,
-            }
-        )
 
-        if res.status_code != 200:
-            raise HTTPException(status_code=500, detail="Sending iMessage failed. Please ensure the messaging server is running.")
-
-        print(f"[Websocket] Completion message sent: {res.status_code}")
+async def reply_to_message(message):
+    try:
+        # Sentences are sent as they are generated, rather than once the whole completion is done
+        async for batch in abatch_sentences(astream_with_retrieved_context(message)):
+            # requests is blocking, so send from a thread
+            await asyncio.to_thread(send_imessage, batch)
     except Exception as e:
-        raise HTTPException(status_code=500, detail="Sending iMessage failed. Please ensure the messaging server is running.")
+        print(f"[Websocket] Error replying to message: {e}")
 
 
 @sio.on("*")
@@ -94,7 +88,7 @@ async def catch_all(event, data):
 
 
 async def start_ws_listener():
-    handshake_success = test_socketio_handshake()
+    handshake_success = await asyncio.to_thread(test_socketio_handshake)
     if not handshake_success:
         print("[Websocket] Handshake failed. Exiting.")
         return
@@ -0,0 +1,143 @@
+"""
+Index the documents of the Chroma collection in the lexical (FTS5) index, and compare the recall of
+vector, lexical, and hybrid retrieval offline. generate_embeddings.py keeps the index in sync afterwards,
+so this only needs to run once for documents stored before the lexical index existed.
+
+Recall is measured on known-item queries: a few words sampled from a stored chunk, which should retrieve that chunk.
+
+Usage:
+`python3 -m src.scripts.build_lexical_index`
+`python3 -m src.scripts.build_lexical_index --skip_build --eval_queries 500`
+"""
+import re
+import time
+import argparse
+import numpy as np
+from dotenv import load_dotenv
+from langchain_chroma import Chroma
+
+load_dotenv(".env")
+from ..ai.ai_models import embedding_function
+from ..ai.rank_fusion import fuse_rankings, get_document_key
+from ..ingestion.lexical_index import LexicalIndex, STOPWORDS
+from ..ingestion.corpus_version import bump_corpus_version
+from ..utils.constants import CHROMA_PATH, LEXICAL_INDEX_PATH, LEXICAL_SEARCH_BUDGET_MS, CORPUS_VERSION_PATH
+
+
+QUERY_WORDS = 3
+
+
+def build_index(_collection, _lexical_index, _page_size):
+    count = _collection.count()
+    stored_ids = set()
+    for offset in range(0, count, _page_size):
+        page = _collection.get(limit=_page_size, offset=offset, include=["documents", "metadatas"])
+        _lexical_index.upsert(page["ids"], page["documents"], page["metadatas"])
+        stored_ids.update(page["ids"])
+        print(f"Indexed {min(offset + _page_size, count)}/{count} documents")
+
+    stale_ids = _lexical_index.ids() - stored_ids
+    _lexical_index.delete(stale_ids)
+    print(f"Removed {len(stale_ids)} documents no longer in the collection")
+
+
+def sample_queries(_lexical_index, _queries, _seed=0):
+    """(chunk id, chunk content, query) tuples, the query being a few distinct words of the chunk in random order"""
+    rng = np.random.default_rng(_seed)
+    rows = _lexical_index._conn.execute("SELECT id, page_content FROM chunks ORDER BY rowid").fetchall()
+    queries = []
+    for row in rng.permutation(len(rows)):
+        doc_id, page_content = rows[row]
+        words = sorted({word for word in re.findall(r"\w+", (page_content or "").lower()) if len(word) > 2 and word not in STOPWORDS})
+        if len(words) < QUERY_WORDS:
+            continue
+        queries.append((doc_id, page_content, " ".join(rng.choice(words, size=QUERY_WORDS, replace=False))))
+        if len(queries) >= _queries:
+            break
+    return queries
+
+
+def evaluate_recall(_vectorstore, _lexical_index, _queries, _k, _candidates, _budget_ms):
+    """Recall@k of vector, lexical, and hybrid retrieval over known-item queries, and lexical search latencies"""
+    embeddings = embedding_function.embed_documents([query for _, _, query in _queries])
+    hits = {"vector": 0, "lexical": 0, "hybrid": 0}
+    latencies = []
+    for (doc_id, page_content, query), embedding in zip(_queries, embeddings):
+        vector_documents = _vectorstore.similarity_search_by_vector(embedding, k=_candidates)
+        start = time.perf_counter()
+        lexical_documents = _lexical_index.search(query, _candidates, budget_ms=_budget_ms)
+        latencies.append((time.perf_counter() - start) * 1000)
+        rankings = {
+            "vector": vector_documents[:_k],
+            "lexical": lexical_documents[:_k],
+            "hybrid": fuse_rankings([vector_documents, lexical_documents], _k),
+        }
+        for name, documents in rankings.items():
+            # Chroma documents may not carry their id, so fall back to matching the content
+            keys = {get_document_key(document) for document in documents}
+            if doc_id in keys or page_content in keys:
+                hits[name] += 1
+
+    recalls = {name: count / len(_queries) for name, count in hits.items()}
+    return recalls, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the lexical index from the Chroma collection, and compare vector, lexical & hybrid recall.")
+    parser.add_argument(
+        "--page_size",
+        type=int,
+        default=5000,
+        help="Number of documents read from Chroma at a time"
+    )
+    parser.add_argument(
+        "--skip_build",
+        action="store_true",
+        help="Only measure recall on the existing lexical index"
+    )
+    parser.add_argument(
+        "--eval_queries",
+        type=int,
+        default=200,
+        help="Number of sampled queries used to measure recall. 0 to skip"
+    )
+    parser.add_argument(
+        "--k",
+        type=int,
+        default=8,
+        help="k used to measure recall@k"
+    )
+    parser.add_argument(
+        "--candidates",
+        type=int,
+        default=20,
+        help="Documents retrieved from each index before rank fusion"
+    )
+    args = parser.parse_args()
+
+    vectorstore = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_function)
+    lexical_index = LexicalIndex(LEXICAL_INDEX_PATH)
+    if not args.skip_build:
+        build_index(vectorstore._collection, lexical_index, args.page_size)
+        bump_corpus_version(CORPUS_VERSION_PATH)
+        print(f"Lexical index saved in {LEXICAL_INDEX_PATH} ({lexical_index.count()} documents)")
+
+    if not args.eval_queries:
+        return
+    queries = sample_queries(lexical_index, args.eval_queries)
+    if not queries:
+        print("No documents to sample queries from.")
+        return
+
+    recalls, latencies = evaluate_recall(vectorstore, lexical_index, queries, args.k, args.candidates, LEXICAL_SEARCH_BUDGET_MS)
+    for name, recall in recalls.items():
+        print(f"{name.capitalize()} recall@{args.k} over {len(queries)} queries: {recall:.4f}")
+    over_budget = sum(latency >= LEXICAL_SEARCH_BUDGET_MS for latency in latencies)
+    print(
+        f"Lexical search latency: p50 {np.percentile(latencies, 50):.1f}ms, p95 {np.percentile(latencies, 95):.1f}ms, "
+        f"{over_budget} queries over the {LEXICAL_SEARCH_BUDGET_MS:g}ms budget"
+    )
+
+
+if __name__ == "__main__":
+    main()
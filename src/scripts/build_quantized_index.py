@@ -0,0 +1,144 @@
+"""
+Build the int8 quantized vector index from the Chroma collection, and measure its recall against exact search.
+Re-run after generating embeddings. Set VECTOR_STORE_BACKEND=quantized to serve queries from it.
+
+Usage:
+`python3 -m src.scripts.build_quantized_index`
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import numpy as np
+from dotenv import load_dotenv
+from langchain_chroma import Chroma
+
+load_dotenv(".env")
+from ..ai.quantized_store import QuantizedVectorStore, quantize, normalize
+from ..ingestion.corpus_version import bump_corpus_version
+from ..utils.constants import CHROMA_PATH, QUANTIZED_INDEX_PATH, CORPUS_VERSION_PATH
+
+
+def build_index(_collection, _path, _page_size):
+    count = _collection.count()
+    first_page = _collection.get(limit=1, include=["embeddings"])
+    if not count or not len(first_page["embeddings"]):
+        raise ValueError(f"No embeddings found in {CHROMA_PATH}")
+    dim = len(first_page["embeddings"][0])
+
+    os.makedirs(_path)
+    shape = (count, dim)
+    vectors = np.memmap(os.path.join(_path, "vectors.i8"), dtype=np.int8, mode="w+", shape=shape)
+    full_vectors = np.memmap(os.path.join(_path, "vectors.f32"), dtype=np.float32, mode="w+", shape=shape)
+    scales = np.empty(count, dtype=np.float32)
+
+    conn = sqlite3.connect(os.path.join(_path, "documents.sqlite3"))
+    conn.execute("CREATE TABLE documents (row INTEGER PRIMARY KEY, id TEXT NOT NULL, page_content TEXT, metadata TEXT)")
+
+    row = 0
+    for offset in range(0, count, _page_size):
+        page = _collection.get(limit=_page_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+        page_vectors = normalize(page["embeddings"])
+        end = row + len(page_vectors)
+
+        full_vectors[row:end] = page_vectors
+        vectors[row:end], scales[row:end] = quantize(page_vectors)
+        conn.executemany(
+            "INSERT INTO documents (row, id, page_content, metadata) VALUES (?, ?, ?, ?)",
+            [
+                (row + i, doc_id, document, json.dumps(metadata or {}))
+                for i, (doc_id, document, metadata) in enumerate(zip(page["ids"], page["documents"], page["metadatas"]))
+            ],
+        )
+        row = end
+        print(f"Indexed {row}/{count} vectors")
+
+    conn.commit()
+    conn.close()
+    vectors.flush()
+    full_vectors.flush()
+    scales[:row].tofile(os.path.join(_path, "scales.f32"))
+    with open(os.path.join(_path, "meta.json"), "w") as f:
+        json.dump({"count": row, "dim": dim}, f)
+
+
+def evaluate_recall(_store, _queries, _k):
+    """
+    Recall@k of the quantized search against exact float32 search, using stored vectors as queries.
+    Each query's own vector is excluded from both result lists.
+    """
+    rng = np.random.default_rng(0)
+    query_rows = rng.choice(_store.count, size=min(_queries, _store.count), replace=False)
+
+    recalls = []
+    for query_row in query_rows:
+        query = np.asarray(_store._full_vectors[query_row])
+
+        exact_scores = np.empty(_store.count, dtype=np.float32)
+        for start in range(0, _store.count, _store.block_size):
+            end = min(start + _store.block_size, _store.count)
+            exact_scores[start:end] = _store._full_vectors[start:end] @ query
+        exact_scores[query_row] = -np.inf
+        exact = set(np.argsort(-exact_scores)[:_k].tolist())
+
+        rows, _ = _store.search_rows(query, _k + 1)
+        approximate = [row for row in rows if row != query_row][:_k]
+        recalls.append(len(exact.intersection(approximate)) / len(exact))
+
+    return float(np.mean(recalls))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build int8 quantized vector index from the Chroma collection.")
+    parser.add_argument(
+        "--page_size",
+        type=int,
+        default=5000,
+        help="Number of vectors read from Chroma at a time"
+    )
+    parser.add_argument(
+        "--eval_queries",
+        type=int,
+        default=200,
+        help="Number of sampled queries used to measure recall"
+    )
+    parser.add_argument(
+        "--k",
+        type=int,
+        default=8,
+        help="k used to measure recall@k"
+    )
+    parser.add_argument(
+        "--min_recall",
+        type=float,
+        default=0.98,
+        help="Keep the previous index if recall@k is below this tolerance"
+    )
+    args = parser.parse_args()
+
+    vectorstore = Chroma(persist_directory=CHROMA_PATH)
+    tmp_path = f"{QUANTIZED_INDEX_PATH}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    build_index(vectorstore._collection, tmp_path, args.page_size)
+
+    store = QuantizedVectorStore(tmp_path, embedding_function=None)
+    int8_bytes = store._vectors.nbytes + store._scales.nbytes
+    float32_bytes = store._full_vectors.nbytes
+    print(f"Scanned vectors: {int8_bytes / 2**20:.1f} MiB int8 vs {float32_bytes / 2**20:.1f} MiB float32 ({float32_bytes / int8_bytes:.1f}x smaller)")
+
+    recall = evaluate_recall(store, args.eval_queries, args.k)
+    print(f"Recall@{args.k} vs exact search over {args.eval_queries} queries: {recall:.4f}")
+    if recall < args.min_recall:
+        print(f"Recall below tolerance {args.min_recall}. Keeping previous index. Try a larger rescore_candidates.")
+        shutil.rmtree(tmp_path)
+        return
+
+    shutil.rmtree(QUANTIZED_INDEX_PATH, ignore_errors=True)
+    os.replace(tmp_path, QUANTIZED_INDEX_PATH)
+    bump_corpus_version(CORPUS_VERSION_PATH)
+    print(f"Quantized index saved in {QUANTIZED_INDEX_PATH}")
+
+
+if __name__ == "__main__":
+    main()
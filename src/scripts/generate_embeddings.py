@@ -1,25 +1,38 @@
 """
 Script to generate embeddings from /data directory and store in Chroma vector DB
 
+txt & csv files are chunked natively. Unstructured is used for other formats, or with --use_unstructured
+
 Notes:
 python3 src/scripts/generate_embeddings.py --folder_path data/apple/notes
 
 Contacts:
 python3 src/scripts/generate_embeddings.py --folder_path data/apple/contacts/data --file_type txt
 
-Messages:
+Messages (from the message store filled by src/scripts/read_imessages_db.py):
+python3 src/scripts/generate_embeddings.py --file_type imessage
 python3 src/scripts/generate_embeddings.py --folder_path data/apple/messages/data --file_type csv
 
 Maps:
 python3 src/scripts/generate_embeddings.py --folder_path data/google/maps --file_type csv --data_type gmaps
 
 Emails:
+python3 src/scripts/generate_embeddings.py --folder_path data/google/gmail --file_type mbox
 python3 src/scripts/generate_embeddings.py --folder_path data/google/gmail/data --file_type eml
+
+Google Takeout & iCloud export zip files (Search & YouTube history, Drive docx, Maps csv, Calendar ics, Notes txt), read without extracting:
+python3 src/scripts/generate_embeddings.py --folder_path data/exports --file_type zip
+
+Compare native & Unstructured chunking throughput on 200 notes:
+python3 src/scripts/generate_embeddings.py --folder_path data/apple/notes --benchmark_chunkers 200
 """
 
 import argparse
 import re
 import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 from glob import glob
 
@@ -28,16 +41,33 @@ from langchain_unstructured import UnstructuredLoader
 from unstructured.cleaners.core import clean_extra_whitespace
 from langchain_chroma import Chroma
 from ..utils.helpers import get_file_metadata, get_date_from_str, remove_image_references
+from ..ingestion.writer import BatchedEmbeddingWriter
+from ..ingestion.manifest import IngestManifest, make_chunk_id, source_key
+from ..ingestion.pipeline import prefetch
+from ..ingestion.checkpoint import CheckpointJournal
+from ..ingestion.profiler import StageProfiler
+from ..ingestion.dedup import NearDuplicateFilter
+from ..ingestion.email_source import iter_mbox_documents
+from ..ingestion.text_source import iter_txt_documents, iter_csv_documents
+from ..ingestion.archive_source import iter_archive_documents
+from ..ingestion.corpus_version import bump_corpus_version
+from ..ingestion.lexical_index import LexicalIndex
+from ..ingestion.metadata_schema import get_schema_metadata
+from ..ingestion.message_store import MessageStore
+from ..ingestion.message_source import iter_message_documents, get_message_source, MESSAGE_SOURCE_PREFIX
 
 load_dotenv(".env")
 from ..ai.ai_models import embedding_function
 
-from ..utils.constants import CHROMA_PATH
+from ..utils.constants import CHROMA_PATH, INGEST_MANIFEST_PATH, INGEST_CHECKPOINT_PATH, DEDUP_SIGNATURES_PATH, MESSAGE_STORE_PATH, CORPUS_VERSION_PATH, LEXICAL_INDEX_PATH
+
+
+FILES_PER_SHARD = 16
+NATIVE_FILE_TYPES = ("txt", "csv")
 
 
 def get_loader(_file_type, _file_paths, _chunk_max_characters):
     if os.getenv("USE_UNSTRUCTURED_API") == "true":
-        print("Using Unstructured API")
         if _file_type == "txt":
             loader = UnstructuredLoader(
                 _file_paths,
@@ -64,7 +94,6 @@ def get_loader(_file_type, _file_paths, _chunk_max_characters):
                 partition_via_api=True,
             )
     else:
-        print("Using Unstructured locally")
         if _file_type == "txt":
             loader = UnstructuredLoader(
                 _file_paths,
@@ -96,6 +125,9 @@ def skip_processing_document(_doc):
 
 
 def process_doc(_doc, _file_type, _data_type=None):
+    source = _doc.metadata["source"]
+    date = _doc.metadata.get("last_modified")
+
     if _file_type == "txt":
         mtdata = get_file_metadata(_doc.metadata["source"])
         type = "/".join(_doc.metadata["file_directory"].split("/")[1:3])
@@ -110,7 +142,7 @@ def process_doc(_doc, _file_type, _data_type=None):
             "type": type,
         }
 
-    elif _file_type == "eml":
+    elif _file_type in ("eml", "mbox"):
         type = "/".join(_doc.metadata["file_directory"].split("/")[1:3])
         sent_from = _doc.metadata.get("sent_from", "")
         _doc.metadata = {
@@ -133,26 +165,220 @@ def process_doc(_doc, _file_type, _data_type=None):
             _doc.metadata["location"] = location
             _doc.metadata["last_modified"] = metadata["last_modified"].split("T")[0]
 
+    elif _file_type == "zip":
+        metadata = _doc.metadata
+        _doc.metadata = {
+            "type": metadata["member_type"],
+            "filename": metadata["filename"],
+            "last_modified": metadata["last_modified"],
+        }
+
+        if metadata["member_type"] == "google/maps":
+            location = os.path.splitext(os.path.basename(metadata["filename"]))[0]
+            _doc.page_content = f"Maps Location: {location}\n{_doc.page_content}"
+            _doc.metadata["location"] = location
+
+    elif _file_type == "imessage":
+        metadata = _doc.metadata
+        _doc.metadata = {
+            "type": "apple/messages",
+            "chat_id": metadata["chat_id"],
+            "chat_name": metadata["chat_name"],
+            "participants": metadata["participants"],
+            "first_rowid": metadata["first_rowid"],
+            "last_rowid": metadata["last_rowid"],
+            "last_modified": metadata["last_modified"].split(" ")[0],
+        }
+
     else:
         raise ValueError(f"Invalid file type: {_file_type}")
-    
+
+    # A date the source already formatted, like an email's date in its sender's timezone, is kept for display
+    _doc.metadata = {**get_schema_metadata(_file_type, source_key(source), date), **_doc.metadata}
     return _doc
 
 
 
+def iter_loaded_documents(_file_paths, _file_type, _chunk_max_characters, _data_type, _profiler=None, _use_unstructured=False):
+    """
+    Lazily parse, filter, and process documents
+    Yields (source file path, processed document) pairs
+    """
+    if _file_type == "mbox":
+        documents = iter_mbox_documents(_file_paths, _chunk_max_characters)
+    elif _file_type == "imessage":
+        documents = iter_message_documents(_file_paths, MESSAGE_STORE_PATH, _chunk_max_characters)
+    elif _file_type == "zip":
+        documents = iter_archive_documents(_file_paths, _chunk_max_characters)
+    elif _file_type == "txt" and not _use_unstructured:
+        documents = iter_txt_documents(_file_paths, _chunk_max_characters)
+    elif _file_type == "csv" and not _use_unstructured:
+        documents = iter_csv_documents(_file_paths, _chunk_max_characters)
+    else:
+        loader = get_loader(_file_type, _file_paths, _chunk_max_characters)
+        documents = loader.lazy_load()
+    if _profiler:
+        documents = _profiler.wrap("partition", documents)
+
+    for doc in documents:
+        if skip_processing_document(doc):
+            continue
+        path = doc.metadata["source"]
+        if _profiler:
+            with _profiler.stage("process_doc"):
+                processed_doc = process_doc(doc, _file_type, _data_type)
+        else:
+            processed_doc = process_doc(doc, _file_type, _data_type)
+        yield path, processed_doc
+
+
+def process_file_shard(_file_paths, _file_type, _chunk_max_characters, _data_type, _profile=False, _use_unstructured=False):
+    """
+    Parse and process a shard of files. Runs in a worker process.
+    Returns the documents, and stage timings if profiling
+    """
+    profiler = StageProfiler() if _profile else None
+    documents = list(iter_loaded_documents(_file_paths, _file_type, _chunk_max_characters, _data_type, profiler, _use_unstructured))
+    return documents, profiler.stages if profiler else {}
+
+
+def iter_sharded_documents(_file_paths, _file_type, _chunk_max_characters, _data_type, _workers, _profiler=None, _use_unstructured=False):
+    """
+    Parse and process files across a pool of worker processes.
+    Results are yielded in file order, with at most a couple of shards per worker held in memory.
+    """
+    def shard_results(future):
+        documents, stages = future.result()
+        if _profiler:
+            _profiler.merge(stages)
+        return documents
+
+    shards = [_file_paths[i:i + FILES_PER_SHARD] for i in range(0, len(_file_paths), FILES_PER_SHARD)]
+    with ProcessPoolExecutor(max_workers=_workers) as executor:
+        pending = deque()
+        for shard in shards:
+            pending.append(executor.submit(
+                process_file_shard, shard, _file_type, _chunk_max_characters, _data_type, _profiler is not None, _use_unstructured
+            ))
+            if len(pending) >= _workers * 2:
+                yield from shard_results(pending.popleft())
+        while pending:
+            yield from shard_results(pending.popleft())
+
+
+def iter_processed_documents(_file_paths, _file_type, _chunk_max_characters, _data_type, _chunk_ids_by_path, _workers=1, _journal=None, _profiler=None, _dedup=None, _use_unstructured=False):
+    """
+    Stream processed documents, assigning each a deterministic chunk ID.
+    Chunk IDs are collected per source file in `_chunk_ids_by_path`.
+    If a checkpoint journal is given, chunks committed by a previous run are not yielded again.
+    If a near-duplicate filter is given, chunks similar to already stored chunks, or to chunks kept earlier in the run, are dropped.
+    """
+    if not _file_paths:
+        return
+
+    if _workers > 1:
+        documents = iter_sharded_documents(_file_paths, _file_type, _chunk_max_characters, _data_type, _workers, _profiler, _use_unstructured)
+    else:
+        documents = iter_loaded_documents(_file_paths, _file_type, _chunk_max_characters, _data_type, _profiler, _use_unstructured)
+
+    current_path = None
+    for path, doc in documents:
+        # Documents arrive in file order, so a new path means the previous file is fully parsed
+        if path != current_path:
+            if current_path and _journal:
+                _journal.file_parsed(current_path)
+            current_path = path
+
+        doc.id = make_chunk_id(source_key(path), doc.page_content)
+        chunk_ids = _chunk_ids_by_path.setdefault(path, set())
+        if doc.id in chunk_ids:
+            continue # identical chunk within the same file
+        if _dedup and _dedup.is_duplicate(doc.id, source_key(path), doc.page_content):
+            continue
+        chunk_ids.add(doc.id)
+        if _profiler:
+            _profiler.record_chunk(doc.page_content)
+        if _journal and not _journal.track(path, doc.id):
+            continue # already embedded & stored before the run was interrupted
+        yield doc
+
+    if current_path and _journal:
+        _journal.file_parsed(current_path)
+
+
+def delete_chunks(_vectorstore, _ids, _dedup=None, _lexical_index=None):
+    if not _ids:
+        return
+    _vectorstore.delete(ids=list(_ids))
+    if _lexical_index:
+        _lexical_index.delete(_ids)
+    bump_corpus_version(CORPUS_VERSION_PATH)
+    if _dedup:
+        _dedup.remove(_ids)
+
+
+def apply_checkpoint(_vectorstore, _manifest, _journal, _dedup=None, _lexical_index=None):
+    """
+    Record files completed by an interrupted run in the manifest, so they are skipped when resuming
+    """
+    for path, entry in _journal.completed_files.items():
+        stale_ids = _manifest.chunk_ids(path) - set(entry["chunk_ids"])
+        delete_chunks(_vectorstore, stale_ids, _dedup, _lexical_index)
+        _manifest.record(path, entry["sha256"], entry["chunk_ids"], mtime=entry["mtime"], size=entry["size"])
+
+    print(f"Resuming: {len(_journal.completed_files)} files and {len(_journal.committed_ids)} chunks already ingested.")
+
+
+def sync_manifest(_vectorstore, _manifest, _changes, _chunk_ids_by_path, _failed_ids, _dedup=None, _lexical_index=None):
+    """
+    Record successfully ingested files in the manifest, and delete chunks which no longer exist in the source files
+    """
+    for path, sha in _changes.changed.items():
+        chunk_ids = _chunk_ids_by_path.get(path, set())
+        if chunk_ids & _failed_ids:
+            print(f"Some chunks of {path} failed to embed. It will be retried on the next run.")
+            continue
+        stale_ids = _manifest.chunk_ids(path) - chunk_ids
+        delete_chunks(_vectorstore, stale_ids, _dedup, _lexical_index)
+        _manifest.record(path, sha, chunk_ids)
+
+    for path in _changes.deleted:
+        stale_ids = _manifest.chunk_ids(path)
+        delete_chunks(_vectorstore, stale_ids, _dedup, _lexical_index)
+        _manifest.remove(path)
+        print(f"Removed {len(stale_ids)} chunks of deleted file {path}")
+
+    _manifest.save()
+
+
+def benchmark_chunkers(_file_paths, _file_type, _chunk_max_characters, _data_type):
+    """Compare throughput of the native chunkers against Unstructured on the same files"""
+    print(f"Benchmarking chunkers on {len(_file_paths)} {_file_type} files")
+    for name, use_unstructured in (("Unstructured", True), ("native", False)):
+        start = time.perf_counter()
+        documents = [doc for _, doc in iter_loaded_documents(
+            _file_paths, _file_type, _chunk_max_characters, _data_type, _use_unstructured=use_unstructured
+        )]
+        elapsed = time.perf_counter() - start
+        characters = sum(len(doc.page_content) for doc in documents)
+        print(
+            f"{name}: {len(documents)} chunks, {characters / max(len(documents), 1):.0f} characters on average, "
+            f"in {elapsed:.2f}s ({len(_file_paths) / max(elapsed, 1e-9):.1f} files/s)"
+        )
+
+
 def main():
     parser = argparse.ArgumentParser(description="Generate embeddings from data directory.")
     parser.add_argument(
         "--folder_path",
         type=str,
-        required=True,
-        help="Path to the folder containing data files"
+        help="Path to the folder containing data files. Not needed for 'imessage'"
     )
     parser.add_argument(
         "--file_type",
         type=str,
         default="txt",
-        help="Specify file type to parse accordingly"
+        help="Specify file type to parse accordingly, or 'imessage' to embed windows of the message store"
     )
     parser.add_argument(
         "--chunk_max_characters",
@@ -170,51 +396,193 @@ def main():
         type=str,
         help="Type of data to process ('gmaps')"
     )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=64,
+        help="Number of documents embedded and stored per batch"
+    )
+    parser.add_argument(
+        "--max_concurrency",
+        type=int,
+        default=4,
+        help="Max number of embedding requests in flight"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-ingest every file, ignoring the manifest of previously ingested files"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes used to parse files"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume an interrupted run from its checkpoint, skipping files and batches it already stored"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Report time & throughput per stage, chunk size histograms, and estimated embedding cost"
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Drop chunks which are near-duplicates of already stored chunks"
+    )
+    parser.add_argument(
+        "--dedup_threshold",
+        type=float,
+        default=0.9,
+        help="Estimated Jaccard similarity above which a chunk is a near-duplicate"
+    )
+    parser.add_argument(
+        "--use_unstructured",
+        action="store_true",
+        help="Parse txt & csv files with Unstructured instead of the native chunkers"
+    )
+    parser.add_argument(
+        "--benchmark_chunkers",
+        type=int,
+        metavar="FILES",
+        help="Compare native & Unstructured chunking throughput on the first FILES txt or csv files, without embedding"
+    )
     args = parser.parse_args()
+    if not args.folder_path and args.file_type != "imessage":
+        parser.error("--folder_path is required")
 
 
     folder_path = args.folder_path
     file_type = args.file_type
     chunk_max_characters = args.chunk_max_characters
     dry_run = args.dry_run
-
-
-    file_paths = [
-        path for path in glob(os.path.join(folder_path, f"**/*.{file_type}"), recursive=True)
-        if os.path.isfile(path)
-    ]
-
-
-    # Parsing, chunking, preprocessing
-    loader = get_loader(file_type, file_paths, chunk_max_characters)
-    documents = loader.load()
-    processed_documents = []
-    for doc in documents:
-        if skip_processing_document(doc):
-            continue
-        processed_doc = process_doc(doc, file_type, args.data_type)
-        processed_documents.append(processed_doc)
-
-    print(f"{len(processed_documents)} documents loaded.")
+    use_unstructured = args.use_unstructured or file_type not in NATIVE_FILE_TYPES
+
+    if args.benchmark_chunkers:
+        if file_type not in NATIVE_FILE_TYPES:
+            parser.error(f"--benchmark_chunkers only applies to {' & '.join(NATIVE_FILE_TYPES)} files")
+        file_paths = sorted(
+            path for path in glob(os.path.join(folder_path, f"**/*.{file_type}"), recursive=True)
+            if os.path.isfile(path)
+        )
+        benchmark_chunkers(file_paths[:args.benchmark_chunkers], file_type, chunk_max_characters, args.data_type)
+        return
+
+    manifest = IngestManifest(INGEST_MANIFEST_PATH)
+    dedup = NearDuplicateFilter(DEDUP_SIGNATURES_PATH, args.dedup_threshold, persist=not dry_run) if args.dedup else None
+    vectorstore = None
+    lexical_index = None
+    journal = None
+    resumed = False
+    if not dry_run:
+        vectorstore = Chroma(
+            persist_directory=CHROMA_PATH,
+            embedding_function=embedding_function,
+        )
+        lexical_index = LexicalIndex(LEXICAL_INDEX_PATH)
+        if not lexical_index.count() and vectorstore._collection.count():
+            print("Lexical index is empty. Run src/scripts/build_lexical_index.py to index previously stored documents.")
+        journal = CheckpointJournal(
+            INGEST_CHECKPOINT_PATH,
+            run_key=[os.path.abspath(folder_path or MESSAGE_STORE_PATH), file_type, chunk_max_characters, args.data_type, use_unstructured],
+        )
+        if args.resume:
+            resumed = journal.load()
+            if resumed:
+                apply_checkpoint(vectorstore, manifest, journal, dedup, lexical_index)
+            else:
+                print("No checkpoint found for this run configuration. Starting from the beginning.")
+
+    if file_type == "imessage":
+        # Each chat of the message store is a source, re-windowed when its messages change
+        message_store = MessageStore(MESSAGE_STORE_PATH)
+        versions = {get_message_source(chat_id): version for chat_id, version in message_store.chat_versions().items()}
+        message_store.close()
+        changes = manifest.diff_sources(versions, MESSAGE_SOURCE_PREFIX, force=args.force)
+        if journal and not args.force:
+            # Windows of a changed chat are mostly unchanged, so only embed the new ones
+            journal.mark_committed(set().union(*(manifest.chunk_ids(source) for source in changes.changed)))
+    else:
+        file_paths = sorted(
+            path for path in glob(os.path.join(folder_path, f"**/*.{file_type}"), recursive=True)
+            if os.path.isfile(path)
+        )
+        changes = manifest.diff(file_paths, folder_path, file_type, force=args.force)
+    print(f"{len(changes.changed)} new or changed files, {len(changes.unchanged)} unchanged files skipped, {len(changes.deleted)} deleted files.")
+
+
+    # Parsing, chunking, preprocessing. Documents are streamed to the embedding writer as they are parsed.
+    chunk_ids_by_path = {path: set() for path in changes.changed}
+    if file_type == "mbox":
+        print("Reading emails directly from mbox files")
+    elif file_type == "imessage":
+        print(f"Reading message windows from {MESSAGE_STORE_PATH}")
+    elif file_type == "zip":
+        print("Streaming documents out of zip archives")
+    elif not use_unstructured:
+        print(f"Chunking {file_type} files natively")
+    else:
+        print("Using Unstructured API" if os.getenv("USE_UNSTRUCTURED_API") == "true" else "Using Unstructured locally")
+    if args.workers > 1:
+        print(f"Parsing with {args.workers} worker processes")
+    profiler = StageProfiler() if args.profile else None
+    documents = iter_processed_documents(
+        list(changes.changed), file_type, chunk_max_characters, args.data_type, chunk_ids_by_path, args.workers, journal, profiler, dedup, use_unstructured
+    )
 
 
     if dry_run:
+        documents_count = 0
+        first_document = None
+        for doc in documents:
+            documents_count += 1
+            first_document = first_document or doc
+        print(f"{documents_count} documents loaded.")
+        if dedup:
+            dedup.print_report()
         print(f"Dry run: documents embeddings not persisted in {CHROMA_PATH}")
-        print(processed_documents[0])
+        if first_document:
+            print(first_document)
+        if profiler:
+            profiler.print_report(args.batch_size, args.max_concurrency, args.workers)
     else:
         # Generate embeddings and store in vector DB
-        vectorstore = Chroma(
-            persist_directory=CHROMA_PATH,
-            embedding_function=embedding_function,
+        journal.open(changes.changed, append=resumed)
+        def on_batch_committed(ids):
+            journal.batch_committed(ids)
+            if dedup:
+                dedup.mark_stored(ids)
+
+        writer = BatchedEmbeddingWriter(
+            vectorstore,
+            embedding_function,
+            batch_size=args.batch_size,
+            max_concurrency=args.max_concurrency,
+            on_batch_committed=on_batch_committed,
+            profiler=profiler,
+            corpus_version_path=CORPUS_VERSION_PATH,
+            lexical_index=lexical_index,
         )
-        for doc in processed_documents:
-            try:
-                vectorstore.add_documents([doc])
-            except Exception as e:
-                print(f"Error embedding doc: {e}. Skipping...")
+        # Parsing runs on a separate thread, at most a few batches ahead of embedding
+        writer.write(prefetch(documents, maxsize=args.batch_size * args.max_concurrency))
+        writer.print_report()
+        print(f"[Embedding Cache] {embedding_function.stats()}")
+
+        if dedup:
+            dedup.commit()
+            dedup.print_report()
+
+        sync_manifest(vectorstore, manifest, changes, chunk_ids_by_path, writer.failed_ids, dedup, lexical_index)
+        journal.close(remove=True)
+        if profiler:
+            profiler.print_report(args.batch_size, args.max_concurrency, args.workers)
 
         print(f"Embeddings generated and persisted in vector store {CHROMA_PATH}")
         print(f"Stored documents: {vectorstore._collection.count()}")
 
-
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Add the shared metadata fields (`source`, `source_id`, epoch `ts`) to chunks stored before they existed,
+see src/ingestion/metadata_schema.py. Metadata is rewritten in place, without re-embedding.
+The lexical index is updated too. Rebuild the quantized index afterwards if it is used.
+
+Usage:
+`python3 -m src.scripts.migrate_metadata --dry_run`
+`python3 -m src.scripts.migrate_metadata`
+"""
+import os
+import argparse
+from dotenv import load_dotenv
+from langchain_chroma import Chroma
+
+load_dotenv(".env")
+from ..ingestion.manifest import IngestManifest
+from ..ingestion.lexical_index import LexicalIndex
+from ..ingestion.metadata_schema import migrate_metadata
+from ..ingestion.corpus_version import bump_corpus_version
+from ..utils.constants import CHROMA_PATH, INGEST_MANIFEST_PATH, LEXICAL_INDEX_PATH, QUANTIZED_INDEX_PATH, CORPUS_VERSION_PATH
+
+
+def migrate_collection(_collection, _source_ids, _page_size, _lexical_index=None, _dry_run=False):
+    """Rewrite the metadata of every chunk missing the shared fields, a page at a time. Returns (migrated, undated) counts"""
+    count = _collection.count()
+    migrated = 0
+    undated = 0
+    for offset in range(0, count, _page_size):
+        page = _collection.get(limit=_page_size, offset=offset, include=["metadatas"])
+        ids = []
+        metadatas = []
+        for doc_id, metadata in zip(page["ids"], page["metadatas"]):
+            metadata = metadata or {}
+            new_metadata = migrate_metadata(metadata, _source_ids.get(doc_id))
+            if new_metadata == metadata:
+                continue
+            ids.append(doc_id)
+            metadatas.append(new_metadata)
+            undated += "ts" not in new_metadata
+
+        if ids and not _dry_run:
+            _collection.update(ids=ids, metadatas=metadatas)
+            if _lexical_index:
+                _lexical_index.update_metadata(ids, metadatas)
+        migrated += len(ids)
+        print(f"Scanned {min(offset + _page_size, count)}/{count} chunks, {migrated} migrated")
+
+    return migrated, undated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add the shared metadata fields to stored chunks, without re-embedding.")
+    parser.add_argument(
+        "--page_size",
+        type=int,
+        default=5000,
+        help="Number of chunks read & updated at a time"
+    )
+    parser.add_argument(
+        "--dry_run",
+        action="store_true",
+        help="Count the chunks to migrate without updating them"
+    )
+    args = parser.parse_args()
+
+    # Chunk IDs are only recorded per source in the manifest
+    manifest = IngestManifest(INGEST_MANIFEST_PATH)
+    source_ids = {chunk_id: source_id for source_id, entry in manifest.files.items() for chunk_id in entry["chunk_ids"]}
+
+    vectorstore = Chroma(persist_directory=CHROMA_PATH)
+    lexical_index = LexicalIndex(LEXICAL_INDEX_PATH) if os.path.exists(LEXICAL_INDEX_PATH) else None
+    migrated, undated = migrate_collection(vectorstore._collection, source_ids, args.page_size, lexical_index, args.dry_run)
+
+    if args.dry_run:
+        print(f"Dry run: {migrated} chunks to migrate, {undated} of them without a parseable date")
+        return
+    if migrated:
+        bump_corpus_version(CORPUS_VERSION_PATH)
+    print(f"{migrated} chunks migrated, {undated} of them without a parseable date")
+    if migrated and os.path.exists(QUANTIZED_INDEX_PATH):
+        print("Run src/scripts/build_quantized_index.py to update the quantized index")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,84 @@
 """
 Script to convert .mbox to individual .eml files
+
+The mbox is memory-mapped and scanned once for message boundaries. Messages are written by a pool
+of worker processes into shard directories of EMAILS_PER_SHARD files each.
+
+Usage:
+`python3 -m src.scripts.process_mbox_file --file_path "data/google/gmail/All mail.mbox" --output_dir data/google/gmail/data`
 """
 import argparse
-import mailbox
-import re
 import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from ..ingestion.mbox_reader import open_mbox, iter_mbox_spans, parse_headers
+
+
+EMAILS_PER_SHARD = 1000
+MESSAGES_PER_TASK = 500
+
+_worker_mbox = None
 
 
 def remove_xml_processing_instructions(text):
     """Remove <?xml...?> and <?php...?> tags in eml files, as it breaks unstructured's parser"""
     patterns = [
-        r'<\?xml[^>]*?>',
-        r'<\?php[^>]*?>',
+        rb'<\?xml[^>]*?>',
+        rb'<\?php[^>]*?>',
     ]
     for pattern in patterns:
-        text = re.sub(pattern, '', text, flags=re.MULTILINE | re.IGNORECASE | re.DOTALL)
+        text = re.sub(pattern, b'', text, flags=re.MULTILINE | re.IGNORECASE | re.DOTALL)
     return text
 
 
+def get_email_path(_output_dir, _email_index):
+    shard_dir = os.path.join(_output_dir, f"shard_{_email_index // EMAILS_PER_SHARD:05d}")
+    return os.path.join(shard_dir, f"email_{_email_index + 1}.eml")
+
+
+def init_worker(_file_path):
+    global _worker_mbox
+    _worker_mbox = open_mbox(_file_path)
+
+
+def write_emails(_spans, _output_dir):
+    """
+    Write a batch of messages as .eml files. Runs in a worker process.
+    Returns the number of emails written & skipped
+    """
+    written = 0
+    skipped = 0
+    for email_index, start, end in _spans:
+        message_bytes = _worker_mbox[start:end]
+        content_type = parse_headers(message_bytes).get_content_type()
+        # Unstructured cannot parse many multipart content-types
+        if content_type.startswith("multipart") and content_type != "multipart/alternative":
+            skipped += 1
+            continue
+
+        email_path = get_email_path(_output_dir, email_index)
+        os.makedirs(os.path.dirname(email_path), exist_ok=True)
+        with open(email_path, "wb") as f:
+            f.write(remove_xml_processing_instructions(message_bytes))
+        written += 1
+
+    return written, skipped
+
+
+def iter_batches(_spans, _batch_size):
+    batch = []
+    for email_index, (start, end) in enumerate(_spans):
+        batch.append((email_index, start, end))
+        if len(batch) >= _batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
 def main():
     parser = argparse.ArgumentParser(description="Create .eml files from .mbox file")
     parser.add_argument(
@@ -31,25 +92,49 @@ def main():
     parser.add_argument(
         "--dry_run",
         action="store_true",
-        help="Load mbox file without processing it"
+        help="Count emails in mbox file without processing it"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of processes writing .eml files"
     )
     args = parser.parse_args()
 
-    mbox = mailbox.mbox(args.file_path)
-    print(f"{len(mbox)} emails found")
+    mbox = open_mbox(args.file_path)
+    mbox_size = len(mbox)
+
+    if args.dry_run:
+        emails_count = sum(1 for _ in iter_mbox_spans(mbox))
+        print(f"{emails_count} emails found")
+        return
+
+    start_time = time.perf_counter()
+    written = 0
+    skipped = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(args.file_path,)) as executor:
+        pending = deque()
+        for batch in iter_batches(iter_mbox_spans(mbox), MESSAGES_PER_TASK):
+            pending.append((executor.submit(write_emails, batch, args.output_dir), batch[-1][2]))
+
+            # Bound in-flight batches, and report progress as they complete in order
+            while len(pending) >= args.workers * 2 or (pending and pending[0][0].done()):
+                future, end = pending.popleft()
+                batch_written, batch_skipped = future.result()
+                written += batch_written
+                skipped += batch_skipped
+                elapsed = time.perf_counter() - start_time
+                print(f"{end / mbox_size:.1%} of mbox processed: {written} emails written, {skipped} skipped ({written / elapsed:.0f} emails/s)")
+
+        for future, _ in pending:
+            batch_written, batch_skipped = future.result()
+            written += batch_written
+            skipped += batch_skipped
 
-    if not args.dry_run:
-        email_id = 1
-        for message in mbox:
-            content_type = message.get_content_type()
-            # Unstructured cannot parse many multipart content-types
-            if content_type.startswith("multipart") and content_type != "multipart/alternative":
-                continue
-            
-            with open(os.path.join(args.output_dir, f"email_{email_id}.eml"), "w", encoding="utf-8") as f:
-                processed_message = remove_xml_processing_instructions(message.as_string())
-                f.write(processed_message)
-            email_id += 1
+    elapsed = time.perf_counter() - start_time
+    print(f"{written + skipped} emails found: {written} written to {args.output_dir}, {skipped} skipped in {elapsed:.1f}s")
 
 
-main()
+if __name__ == "__main__":
+    main()
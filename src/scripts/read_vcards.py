@@ -1,13 +1,21 @@
 """
 Read vcf files to process Apple contacts
 
+Every card of each vcf file is indexed in the contact index (CONTACT_INDEX_PATH), used for exact contact lookups in chat
+and to name iMessage senders & recipients. A txt file is also written per contact, to be embedded.
+
 Usage:
-`python3 src/scripts/read_vcards.py`
+`python3 -m src.scripts.read_vcards`
 
 """
 import os
 from glob import glob
-import vobject
+from dotenv import load_dotenv
+
+from ..utils.contact_index import ContactIndex
+
+load_dotenv(".env")
+from ..utils.paths import CONTACT_INDEX_PATH
 
 
 def unfold_lines(content):
@@ -30,46 +38,37 @@ def clean_vcard(content):
     return content
 
 
+def format_contact(contact):
+    contact_str = ""
+    for k, v in contact.items():
+        if k == "name":
+            contact_str += f"Contact info for {v}\n"
+        else:
+            contact_str += f"{k}: {', '.join(v) if isinstance(v, list) else v}\n"
+    return contact_str
+
+
 def main():
     vcf_file_paths = [
         path for path in glob(os.path.join("data/apple/contacts", "**/*.vcf"), recursive=True)
         if os.path.isfile(path)
     ]
-    contacts = []
+    contact_index = ContactIndex()
 
     for vcf_file_path in vcf_file_paths:
         with open(vcf_file_path, "r") as f:
             content = f.read()
             unfolded_content = unfold_lines(content)
             cleaned_content = clean_vcard(unfolded_content)
-            vcard = vobject.readOne(cleaned_content)
-
-            contact_info = {}
-            if hasattr(vcard, "fn"):
-                contact_info["name"] = vcard.fn.value
-            if hasattr(vcard, "tel_list"):
-                contact_info["phone_numbers"] = ", ".join([tel.value for tel in vcard.tel_list]).replace("\xa0", " ")
-            if hasattr(vcard, "email_list"):
-                contact_info["emails"] = ", ".join([email.value for email in vcard.email_list])
-            if hasattr(vcard, "bday"):
-                contact_info["birthday"] = vcard.bday.value
-            if hasattr(vcard, "adr"):
-                contact_info["address"] = str(vcard.adr.value).replace("\n", "; ")
-
-            contact_str = ""
-            for k, v in contact_info.items():
-                if k == "name":
-                    contact_str += f"Contact info for {v}\n"
-                else:
-                    contact_str += f"{k}: {v}\n"
-            contacts.append(contact_str)
-
-
-    for i, contact in enumerate(contacts):
+            # A vcf file can hold many cards, e.g. when exporting all contacts at once
+            contact_index.add_vcards(cleaned_content)
+
+    for i, contact in enumerate(contact_index.contacts):
         with open(os.path.join("data/apple/contacts/data", f"contact_{i+1}.txt"), "w", encoding="utf-8") as new_file:
-            new_file.write(contact)
+            new_file.write(format_contact(contact))
 
-    print(f"Processed {len(contacts)} contacts successfully")
+    contact_index.save(CONTACT_INDEX_PATH)
+    print(f"Processed {len(contact_index)} contacts successfully. Contact index saved to {CONTACT_INDEX_PATH}")
 
 
 if __name__ == "__main__":
@@ -1,6 +1,23 @@
 import os
 
-CHROMA_PATH = os.path.join(os.getcwd(), os.environ.get("CHROMA_DIRNAME", "chroma_db"))
+from .paths import (
+    CHROMA_PATH,
+    INGEST_MANIFEST_PATH,
+    INGEST_CHECKPOINT_PATH,
+    DEDUP_SIGNATURES_PATH,
+    EMBEDDING_CACHE_PATH,
+    QUANTIZED_INDEX_PATH,
+    MESSAGE_STORE_PATH,
+    CONTACT_INDEX_PATH,
+    CORPUS_VERSION_PATH,
+    LEXICAL_INDEX_PATH,
+)
+LEXICAL_SEARCH_BUDGET_MS = float(os.environ.get("LEXICAL_SEARCH_BUDGET_MS", "50"))
+RESPONSE_CACHE_THRESHOLD = float(os.environ.get("RESPONSE_CACHE_THRESHOLD", "0.97"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "86400"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RAG_CONTEXT_MAX_TOKENS = int(os.environ.get("RAG_CONTEXT_MAX_TOKENS", "3000"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "250000"))
 DISCORD_APP_ID = 1369249100507123722
 DISCORD_CHANNEL_ID = int(os.environ.get("DISCORD_CHANNEL_ID", "0"))
 DISCORD_USER_ID = int(os.environ.get("DISCORD_USER_ID", "0"))
@@ -0,0 +1,186 @@
+import os
+import re
+import json
+import vobject
+
+from .helpers import normalize_phone_number
+
+
+# Fields of exact contact lookups, by the words naming them. A phrase naming several, like "email address", is the first field
+CONTACT_FIELD_KEYWORDS = {
+    "phone_numbers": ("number", "phone", "cell", "mobile"),
+    "emails": ("email", "e-mail"),
+    "birthday": ("birthday", "bday"),
+    "address": ("address",),
+}
+# Words qualifying a field in a lookup, ex: "Sam's home address", "cell number for Sam"
+CONTACT_FIELD_QUALIFIERS = ("home", "work", "personal", "mailing", "cell", "mobile", "phone", "email", "e-mail")
+# What can follow a looked up field, so that it is the object of the question, ex: not "Sam's address change"
+LOOKUP_END = r"\s*(?:$|[?.!,;:)]|(?:please|pls|again|so|to|for|from|in|on|that|thanks|thx)\b)"
+NAME_WORD = r"[\w-]+"
+
+
+def get_lookup_pattern():
+    keywords = "|".join(re.escape(keyword) for keywords in CONTACT_FIELD_KEYWORDS.values() for keyword in keywords)
+    qualifiers = "|".join(re.escape(qualifier) for qualifier in CONTACT_FIELD_QUALIFIERS)
+    term = rf"(?:(?:{qualifiers})\s+)?(?:{keywords})s?"
+    terms = rf"{term}(?:\s*(?:,|and|&|or)\s*{term})*"
+    return (
+        # "what's Sam's number?", "whats sams cell number", "mom's address"
+        re.compile(rf"\b((?:{NAME_WORD}\s+){{0,2}}{NAME_WORD}?)(['’]s|s)\s+({terms})(?={LOOKUP_END})"),
+        # "email for Sam Lee", "phone number of mom"
+        re.compile(rf"\b({terms})\s+(?:for|of)\s+((?:{NAME_WORD}\s+){{0,2}}{NAME_WORD})"),
+    )
+
+
+POSSESSIVE_LOOKUP_PATTERN, FIELD_OF_LOOKUP_PATTERN = get_lookup_pattern()
+
+
+def get_lookup_fields(terms):
+    """Fields named by the terms of a lookup, ex: 'cell number and email address' -> ['phone_numbers', 'emails']"""
+    fields = []
+    for term in re.split(r"\s*(?:,|\band\b|&|\bor\b)\s*", terms):
+        for field, keywords in CONTACT_FIELD_KEYWORDS.items():
+            if any(re.search(rf"\b{re.escape(keyword)}s?\b", term) for keyword in keywords):
+                if field not in fields:
+                    fields.append(field)
+                break
+    return fields
+
+
+def get_handle_key(handle):
+    """
+    Lookup key of a phone number or email, so that differently formatted handles of a contact match,
+    ex: '+1 (555) 123-4567' and '5551234567'
+    """
+    handle = handle.strip()
+    if "@" in handle:
+        return handle.lower()
+    digits = re.sub(r"\D", "", normalize_phone_number(handle))
+    # Compare the last 10 digits, ignoring country codes
+    return digits[-10:] if len(digits) >= 7 else None
+
+
+def read_vcard(vcard):
+    """Contact info of a parsed vcard"""
+    contact = {}
+    if hasattr(vcard, "fn"):
+        contact["name"] = vcard.fn.value
+    if hasattr(vcard, "tel_list"):
+        contact["phone_numbers"] = [tel.value.replace("\xa0", " ") for tel in vcard.tel_list]
+    if hasattr(vcard, "email_list"):
+        contact["emails"] = [email.value for email in vcard.email_list]
+    if hasattr(vcard, "bday"):
+        contact["birthday"] = str(vcard.bday.value)
+    if hasattr(vcard, "adr"):
+        contact["address"] = str(vcard.adr.value).replace("\n", "; ")
+    return contact
+
+
+class ContactIndex:
+    """
+    Contacts keyed by phone number, email, and name, for exact lookups without going through the vector store.
+    Built from vcf files by src/scripts/read_vcards.py, and persisted as JSON.
+    """
+    def __init__(self, contacts=None):
+        self.contacts = []
+        self._by_handle = {}
+        self._by_name = {}
+        for contact in contacts or []:
+            self.add(contact)
+
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f)["contacts"])
+
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"contacts": self.contacts}, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+
+    def add(self, contact):
+        index = len(self.contacts)
+        self.contacts.append(contact)
+        for handle in [*contact.get("phone_numbers", []), *contact.get("emails", [])]:
+            key = get_handle_key(handle)
+            if key:
+                self._by_handle.setdefault(key, index)
+
+        name = contact.get("name", "").strip().lower()
+        if name:
+            self._by_name.setdefault(name, set()).add(index)
+            first_name = name.split()[0]
+            if first_name != name:
+                self._by_name.setdefault(first_name, set()).add(index)
+
+
+    def add_vcards(self, content):
+        """Add every card of a vcf file's content, in one pass"""
+        added = 0
+        for vcard in vobject.readComponents(content, ignoreUnreadable=True):
+            contact = read_vcard(vcard)
+            if contact:
+                self.add(contact)
+                added += 1
+        return added
+
+
+    def find_by_handle(self, handle):
+        key = get_handle_key(handle) if handle else None
+        index = self._by_handle.get(key) if key else None
+        return self.contacts[index] if index is not None else None
+
+
+    def resolve_name(self, handle):
+        """Name of the contact with a phone number or email, or the handle itself if unknown"""
+        contact = self.find_by_handle(handle)
+        return contact.get("name", handle) if contact else handle
+
+
+    def find_by_name(self, name):
+        """Contact with a full or first name, case-insensitively. None if there is no unambiguous match."""
+        indexes = self._by_name.get(name.strip().lower())
+        return self.contacts[next(iter(indexes))] if indexes and len(indexes) == 1 else None
+
+
+    def find_lookup(self, text):
+        """
+        Contact & fields of an exact contact lookup, ex: "what's Sam's number?" or "email for sam lee" -> (Sam's contact, ['emails']).
+        Names only count when followed by a possessive & field, or preceded by "<field> for/of", so that
+        "what did Sam email me?" isn't a lookup. None if the text isn't one, or names no known contact.
+        """
+        lowered = re.sub(r"\s+", " ", text.lower())
+        for match in POSSESSIVE_LOOKUP_PATTERN.finditer(lowered):
+            words, possessive, terms = match.group(1).split(), match.group(2), match.group(3)
+            # The closest words to the possessive are the name, ex: 'tell me sam' -> 'sam'
+            for size in range(len(words), 0, -1):
+                name = " ".join(words[-size:])
+                # Without an apostrophe, the 's' may be part of the name, ex: 'chris number'
+                candidates = [name] if possessive != "s" else [name + "s", name]
+                contact = next((contact for contact in map(self.find_by_name, candidates) if contact), None)
+                if contact:
+                    return contact, get_lookup_fields(terms)
+
+        for match in FIELD_OF_LOOKUP_PATTERN.finditer(lowered):
+            terms, words = match.group(1), match.group(2).split()
+            for size in range(len(words), 0, -1):
+                name = " ".join(words[:size])
+                rest = lowered[match.start(2) + len(name):]
+                if not re.match(LOOKUP_END, rest):
+                    continue
+                contact = self.find_by_name(name)
+                if contact:
+                    return contact, get_lookup_fields(terms)
+        return None
+
+
+    def __len__(self):
+        return len(self.contacts)
@@ -1,7 +1,10 @@
 import re
 import os
 import unicodedata
-from datetime import datetime
+from datetime import date, datetime, time
+from email.utils import parsedate_to_datetime
+import dateutil.parser
+from bs4 import BeautifulSoup
 
 
 def get_date_from_str(timestamp: str):
@@ -25,6 +28,29 @@ def get_date_from_epoch(epoch):
     return datetime.fromtimestamp(epoch).date().isoformat()
 
 
+def get_timestamp(value):
+    """
+    Epoch seconds of a datetime, date, epoch, or date string (ISO, or RFC 2822 like email Date headers).
+    None if it can't be parsed. Dates without a timezone are local times.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    if isinstance(value, date):
+        return int(datetime.combine(value, time()).timestamp())
+    try:
+        return int(dateutil.parser.parse(value).timestamp())
+    except (ValueError, OverflowError):
+        pass
+    try:
+        return int(parsedate_to_datetime(value).timestamp())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
 def get_file_metadata(path):
     try:
         stats = os.stat(path)
@@ -33,8 +59,10 @@ def get_file_metadata(path):
         if not stats:
             return mtdata
 
-        if stats.st_birthtime:
-            mtdata["created_at"] = get_date_from_epoch(stats.st_birthtime)
+        # st_birthtime only exists on macOS & BSD
+        created_at = getattr(stats, "st_birthtime", None) or stats.st_mtime
+        if created_at:
+            mtdata["created_at"] = get_date_from_epoch(created_at)
         if stats.st_mtime:
             mtdata["updated_at"] = get_date_from_epoch(stats.st_mtime)
 
@@ -58,6 +86,14 @@ def normalize_phone_number(phone_number):
     return phone_number.replace(" ", "").replace("-", "").replace("(", "").replace(")", "")
 
 
+def html_to_text(html: str)->str:
+    """Extract visible text from html, like email bodies"""
+    soup = BeautifulSoup(html, "html.parser")
+    for element in soup(["script", "style"]):
+        element.decompose()
+    return soup.get_text(" ")
+
+
 def clean_text(text: str)->str:
     """Clean unnecessary characters in text like emails"""
     # Normalize Unicode characters
@@ -74,3 +110,17 @@ def clean_text(text: str)->str:
     
     # Strip leading/trailing whitespace
     return text.strip()
+
+
+def split_message_text(text, max_characters):
+    """
+    Split text longer than a message into complete messages, each split at the last whitespace before the limit,
+    and the rest. The rest is "" when only whitespace is left, so that no blank message is sent for it.
+    """
+    messages = []
+    while len(text) > max_characters:
+        split_at = max(text.rfind(" ", 0, max_characters + 1), text.rfind("\n", 0, max_characters + 1))
+        split_at = split_at if split_at > 0 else max_characters
+        messages.append(text[:split_at].rstrip())
+        text = text[split_at:].lstrip()
+    return messages, text
@@ -1,4 +1,5 @@
 import os
+import re
 import asyncio
 import requests
 from fastapi import HTTPException
@@ -13,6 +14,28 @@ from .constants import (
 )
 
 
+# Streamed completions are sent over iMessage in batches of whole sentences of at least this length
+IMESSAGE_BATCH_MIN_CHARACTERS = 160
+SENTENCE_END_PATTERN = re.compile(r"[.!?](?=\s)|\n")
+
+
+async def abatch_sentences(chunks, min_characters=IMESSAGE_BATCH_MIN_CHARACTERS):
+    """
+    Regroup streamed text chunks into batches of whole sentences of at least `min_characters`,
+    so that a streamed completion is sent as a few messages instead of one per token. The last batch is the remainder.
+    """
+    buffer = ""
+    async for chunk in chunks:
+        buffer += chunk
+        sentence_ends = [match.end() for match in SENTENCE_END_PATTERN.finditer(buffer)]
+        if sentence_ends and sentence_ends[-1] >= min_characters:
+            batch, buffer = buffer[:sentence_ends[-1]].strip(), buffer[sentence_ends[-1]:]
+            if batch:
+                yield batch
+    if buffer.strip():
+        yield buffer.strip()
+
+
 async def send_discord_message(message: str, retries: int = 3):
     """
     Send a message to the configured Discord channel or user DM
@@ -80,4 +103,4 @@ async def send_message(message: str):
         await send_discord_message(message)
 
     if os.environ.get("ENABLE_WEBSOCKET_LISTENER") == "true":
-        send_imessage(message)
+        await asyncio.to_thread(send_imessage, message)
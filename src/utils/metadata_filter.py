@@ -0,0 +1,64 @@
+COMPARISON_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def get_where_sql(where=None, where_document=None, metadata_column="metadata", content_column="page_content"):
+    """
+    SQL condition & parameters equivalent to Chroma `where` & `where_document` filters,
+    for SQLite tables storing chunk metadata as JSON, like the quantized index and the lexical index.
+    Returns ("1", []) when there are no filters.
+    """
+    clauses = []
+    params = []
+    if where:
+        clause, clause_params = _get_where_clause(where, metadata_column)
+        clauses.append(clause)
+        params.extend(clause_params)
+    if where_document:
+        clause, clause_params = _get_where_document_clause(where_document, content_column)
+        clauses.append(clause)
+        params.extend(clause_params)
+    return " AND ".join(clauses) or "1", params
+
+
+def _get_where_clause(where, metadata_column):
+    clauses = []
+    params = []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            subclauses = [_get_where_clause(subcondition, metadata_column) for subcondition in condition]
+            clauses.append("(" + f" {key[1:].upper()} ".join(clause for clause, _ in subclauses) + ")")
+            params.extend(param for _, clause_params in subclauses for param in clause_params)
+            continue
+
+        field = f"json_extract({metadata_column}, ?)"
+        path = f'$."{key}"'
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, value in condition.items():
+            if operator in ("$in", "$nin"):
+                placeholders = ",".join("?" * len(value))
+                clauses.append(f"{field} {'NOT IN' if operator == '$nin' else 'IN'} ({placeholders})")
+                params.extend([path, *value])
+            elif operator in COMPARISON_OPERATORS:
+                clauses.append(f"{field} {COMPARISON_OPERATORS[operator]} ?")
+                params.extend([path, value])
+            else:
+                raise ValueError(f"Unsupported where operator: {operator}")
+    return "(" + " AND ".join(clauses) + ")", params
+
+
+def _get_where_document_clause(where_document, content_column):
+    clauses = []
+    params = []
+    for operator, value in where_document.items():
+        if operator in ("$and", "$or"):
+            subclauses = [_get_where_document_clause(subcondition, content_column) for subcondition in value]
+            clauses.append("(" + f" {operator[1:].upper()} ".join(clause for clause, _ in subclauses) + ")")
+            params.extend(param for _, clause_params in subclauses for param in clause_params)
+        elif operator in ("$contains", "$not_contains"):
+            # Case sensitive, like Chroma
+            clauses.append(f"instr({content_column}, ?) {'>' if operator == '$contains' else '='} 0")
+            params.append(value)
+        else:
+            raise ValueError(f"Unsupported where_document operator: {operator}")
+    return "(" + " AND ".join(clauses) + ")", params
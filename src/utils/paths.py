@@ -0,0 +1,16 @@
+"""
+Paths of the local stores. Kept apart from constants.py, which requires the server's credentials,
+so that offline scripts can import them without a full .env
+"""
+import os
+
+CHROMA_PATH = os.path.join(os.getcwd(), os.environ.get("CHROMA_DIRNAME", "chroma_db"))
+INGEST_MANIFEST_PATH = os.path.join(CHROMA_PATH, "ingest_manifest.json")
+INGEST_CHECKPOINT_PATH = os.path.join(CHROMA_PATH, "ingest_checkpoint.jsonl")
+DEDUP_SIGNATURES_PATH = os.path.join(CHROMA_PATH, "dedup_signatures.sqlite3")
+EMBEDDING_CACHE_PATH = os.path.join(CHROMA_PATH, "embedding_cache.sqlite3")
+QUANTIZED_INDEX_PATH = os.path.join(CHROMA_PATH, "quantized_index")
+MESSAGE_STORE_PATH = os.path.join(CHROMA_PATH, "messages.sqlite3")
+CONTACT_INDEX_PATH = os.path.join(CHROMA_PATH, "contacts.json")
+CORPUS_VERSION_PATH = os.path.join(CHROMA_PATH, "corpus_version")
+LEXICAL_INDEX_PATH = os.path.join(CHROMA_PATH, "lexical_index.sqlite3")
@@ -0,0 +1,43 @@
+import io
+
+import pytest
+
+from src.ingestion.archive_source import iter_json_array, get_member_type
+
+
+ARRAY = '[{"title": "Searched for tahoe", "time": "2024-01-02T10:00:00Z"}, 1.5, 22, "a, ] string", [1, [2]], -0.25e3, true, null]'
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 3, 5, 7, 64])
+def test_iter_json_array_across_read_boundaries(block_size):
+    items = list(iter_json_array(io.StringIO(ARRAY), block_size))
+
+    assert items == [{"title": "Searched for tahoe", "time": "2024-01-02T10:00:00Z"}, 1.5, 22, "a, ] string", [1, [2]], -250.0, True, None]
+
+
+@pytest.mark.parametrize("block_size", [1, 3, 64])
+def test_iter_json_array_numbers_split_by_reads(block_size):
+    assert list(iter_json_array(io.StringIO("[1.5, 22]"), block_size)) == [1.5, 22]
+    assert list(iter_json_array(io.StringIO(" [ 10 , 200 ] \n"), block_size)) == [10, 200]
+
+
+@pytest.mark.parametrize("text", ["[1, 2", "[1, 2,", '[{"a": 1}', "[1.]", "[1 2]"])
+@pytest.mark.parametrize("block_size", [1, 3, 64])
+def test_iter_json_array_raises_on_truncated_or_invalid_json(text, block_size):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), block_size))
+
+
+@pytest.mark.parametrize("block_size", [1, 64])
+def test_iter_json_array_yields_other_values_whole(block_size):
+    assert list(iter_json_array(io.StringIO('{"a": [1, 2]}'), block_size)) == [{"a": [1, 2]}]
+    assert list(iter_json_array(io.StringIO("123"), block_size)) == [123]
+    assert list(iter_json_array(io.StringIO("[]"), block_size)) == []
+    assert list(iter_json_array(io.StringIO(""), block_size)) == []
+
+
+def test_get_member_type():
+    assert get_member_type("Takeout/My Activity/Search/MyActivity.json") == "google/search"
+    assert get_member_type("Takeout/Drive/trip.docx") == "google/drive"
+    assert get_member_type("iCloud Notes/Notes/todo.txt") == "apple/notes"
+    assert get_member_type("Takeout/Calendar/Sam.ics") == "google/calendar"
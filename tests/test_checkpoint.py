@@ -0,0 +1,67 @@
+from src.ingestion.checkpoint import CheckpointJournal
+
+
+def test_resume_skips_committed_chunks_and_completed_files(tmp_path):
+    journal_path = str(tmp_path / "checkpoint.jsonl")
+    done_file = tmp_path / "done.txt"
+    partial_file = tmp_path / "partial.txt"
+    done_file.write_text("done")
+    partial_file.write_text("partial")
+    done, partial = str(done_file), str(partial_file)
+
+    journal = CheckpointJournal(journal_path, "run")
+    journal.open({done: "sha-done", partial: "sha-partial"})
+    assert journal.track(done, "d1")
+    assert journal.track(partial, "p1")
+    assert journal.track(partial, "p2")
+    journal.file_parsed(done)
+    journal.batch_committed(["d1", "p1"])
+    journal.close() # interrupted before p2 is stored
+
+    resumed = CheckpointJournal(journal_path, "run")
+    assert resumed.load()
+    assert list(resumed.completed_files) == [done]
+    assert resumed.completed_files[done]["sha256"] == "sha-done"
+    assert resumed.completed_files[done]["chunk_ids"] == ["d1"]
+    assert resumed.committed_ids == {"d1", "p1"}
+
+    resumed.open({partial: "sha-partial"}, append=True)
+    assert not resumed.track(partial, "p1")
+    assert resumed.track(partial, "p2")
+    resumed.file_parsed(partial)
+    assert partial not in resumed.completed_files
+    resumed.batch_committed(["p2"])
+    resumed.close()
+
+    final = CheckpointJournal(journal_path, "run")
+    assert final.load()
+    assert final.completed_files[partial]["chunk_ids"] == ["p1", "p2"]
+
+
+def test_load_ignores_journal_of_another_run(tmp_path):
+    journal_path = str(tmp_path / "checkpoint.jsonl")
+    journal = CheckpointJournal(journal_path, "run-a")
+    journal.open({})
+    journal.batch_committed(["a"])
+    journal.close()
+
+    assert not CheckpointJournal(journal_path, "run-b").load()
+
+
+def test_load_stops_at_partially_written_line(tmp_path):
+    journal_path = tmp_path / "checkpoint.jsonl"
+    journal_path.write_text('{"run_key": "run"}\n{"batch": ["a"]}\n{"batch": ["b"')
+
+    journal = CheckpointJournal(str(journal_path), "run")
+
+    assert journal.load()
+    assert journal.committed_ids == {"a"}
+
+
+def test_close_can_remove_journal(tmp_path):
+    journal_path = tmp_path / "checkpoint.jsonl"
+    journal = CheckpointJournal(str(journal_path), "run")
+    journal.open({})
+    journal.close(remove=True)
+
+    assert not journal_path.exists()
@@ -0,0 +1,52 @@
+from src.ingestion.chunkers import chunk_by_title, chunk_rows, is_title, split_text
+
+
+def test_split_text_breaks_between_sentences_then_words():
+    text = "First sentence here. Second sentence is a bit longer. Third."
+
+    assert split_text(text, 100) == [text]
+    assert split_text(text, 30) == ["First sentence here.", "Second sentence is a bit", "longer. Third."]
+    assert split_text("abcdefghij", 4) == ["abcd", "efgh", "ij"]
+    assert all(len(chunk) <= 30 for chunk in split_text(text * 5, 30))
+
+
+def test_is_title():
+    assert is_title("Packing list")
+    assert not is_title("Bring your passport.")
+    assert not is_title("Line one\nline two")
+
+
+def test_chunk_by_title_combines_short_sections():
+    note = "Packing list\n\nPassport\n\nCharger\n\nSunscreen\n\nWifi password\n\nhunter2 for the cabin\n\nGate code\n\n4821"
+
+    assert chunk_by_title(note, 1500) == [note]
+    assert chunk_by_title(note, 40) == [
+        "Packing list\n\nPassport\n\nCharger",
+        "Sunscreen\n\nWifi password",
+        "hunter2 for the cabin\n\nGate code\n\n4821",
+    ]
+
+
+def test_chunk_by_title_starts_new_chunk_at_title_past_combine_threshold():
+    text = "Trip\n\nWe drive up on Friday morning.\n\nBudget\n\nAbout 300 dollars each."
+
+    assert chunk_by_title(text, 1500, combine_under_characters=20) == [
+        "Trip\n\nWe drive up on Friday morning.",
+        "Budget\n\nAbout 300 dollars each.",
+    ]
+
+
+def test_chunk_by_title_splits_long_paragraphs_and_collapses_whitespace():
+    text = "Notes\n\n" + "word   " * 50
+
+    chunks = chunk_by_title(text, 100)
+
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert "  " not in "".join(chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_chunk_rows_repeats_header():
+    chunks = chunk_rows(["name", "phone"], [["Sam", "555"], ["Alex", "556"], ["", " "], ["Kim", "557"]], 27)
+
+    assert chunks == ["name phone\nSam 555\nAlex 556", "name phone\nKim 557"]
@@ -0,0 +1,70 @@
+import pytest
+
+from src.utils.contact_index import ContactIndex, get_handle_key
+
+
+@pytest.fixture
+def contact_index():
+    return ContactIndex([
+        {"name": "Sam Lee", "phone_numbers": ["+1 (415) 555-2013"], "emails": ["sam@x.com"], "address": "1 Main St", "birthday": "1990-01-02"},
+        {"name": "Will Smith", "phone_numbers": ["415-555-0000"]},
+        {"name": "Mom", "address": "2 Oak Ave"},
+        {"name": "Chris Doe", "phone_numbers": ["415-555-1111"]},
+        {"name": "Sam Park"},
+    ])
+
+
+def test_get_handle_key():
+    assert get_handle_key("+1 (415) 555-2013") == get_handle_key("4155552013")
+    assert get_handle_key(" Sam@X.com ") == "sam@x.com"
+
+
+def test_find_by_handle_and_resolve_name(contact_index):
+    assert contact_index.resolve_name("4155552013") == "Sam Lee"
+    assert contact_index.resolve_name("+15550001234") == "+15550001234"
+
+
+def test_find_by_name_needs_an_unambiguous_match(contact_index):
+    assert contact_index.find_by_name("sam lee")["name"] == "Sam Lee"
+    assert contact_index.find_by_name("Will")["name"] == "Will Smith"
+    assert contact_index.find_by_name("sam") is None
+
+
+@pytest.mark.parametrize("message, name, fields", [
+    ("what's Sam Lee's number?", "Sam Lee", ["phone_numbers"]),
+    ("What is Sam Lee's email address?", "Sam Lee", ["emails"]),
+    ("sam lee's cell number and home address", "Sam Lee", ["phone_numbers", "address"]),
+    ("what's mom's address?", "Mom", ["address"]),
+    ("whats moms address", "Mom", ["address"]),
+    ("chris number please", "Chris Doe", ["phone_numbers"]),
+    ("Will you tell me Chris's number", "Chris Doe", ["phone_numbers"]),
+    ("email for Sam Lee", "Sam Lee", ["emails"]),
+    ("birthday of sam lee?", "Sam Lee", ["birthday"]),
+])
+def test_find_lookup(contact_index, message, name, fields):
+    contact, lookup_fields = contact_index.find_lookup(message)
+
+    assert contact["name"] == name
+    assert lookup_fields == fields
+
+
+@pytest.mark.parametrize("message", [
+    "What did Sam Lee email me about the trip?",
+    "Did Sam Lee send the address of the Airbnb?",
+    "Tell me about Sam Lee's address change",
+    "What did Mom's friend email me?",
+    "address for mom's party",
+    "what's Sam's number?", # two contacts named Sam
+])
+def test_find_lookup_ignores_other_messages(contact_index, message):
+    assert contact_index.find_lookup(message) is None
+
+
+def test_add_vcards():
+    contact_index = ContactIndex()
+    added = contact_index.add_vcards(
+        "BEGIN:VCARD\nVERSION:3.0\nFN:Sam Lee\nTEL:+1 415 555 2013\nEMAIL:sam@x.com\nEND:VCARD\n"
+    )
+
+    assert added == 1
+    assert contact_index.find_by_handle("sam@x.com")["phone_numbers"] == ["+1 415 555 2013"]
@@ -0,0 +1,95 @@
+from langchain_core.documents import Document
+
+from src.ai.context_packer import ContextPacker, CharacterEncoding, render_metadata
+
+
+def make_packer(**kwargs):
+    packer = ContextPacker(**kwargs)
+    # Avoid downloading tiktoken's encoding
+    packer._encoding = CharacterEncoding()
+    return packer
+
+
+def email(doc_id, content, sender, subject, day):
+    return Document(id=doc_id, page_content=content, metadata={
+        "type": "google/gmail",
+        "source_id": "/mail/inbox.mbox",
+        "last_modified": day,
+        "sent_from": f"['{sender}']",
+        "subject": subject,
+    })
+
+
+def test_render_metadata():
+    header = render_metadata({"type": "apple/notes", "last_modified": "2024-01-02", "filename": "/data/notes/trip.txt", "ts": 1})
+
+    assert header == "[apple/notes | 2024-01-02 | file: trip.txt]"
+
+
+def test_chunks_of_the_same_document_are_merged_and_deduplicated():
+    documents = [
+        email("1", "Flight is at 9am\nGate 4", "alice@x.com", "Flight", "2024-04-01"),
+        email("2", "Gate 4\nBring your passport", "alice@x.com", "Flight", "2024-04-01"),
+    ]
+
+    context, stats = make_packer().pack(documents)
+
+    assert context == "[google/gmail | 2024-04-01 | from: alice@x.com | subject: Flight]\nFlight is at 9am\nGate 4\nBring your passport"
+    assert stats["passages"] == 1
+    assert stats["merged_chunks"] == 1
+    assert stats["duplicate_lines"] == 1
+
+
+def test_documents_of_the_same_file_keep_their_own_header():
+    documents = [
+        email("1", "Flight is at 9am", "alice@x.com", "Flight", "2024-04-01"),
+        email("2", "Your dentist appointment is Tuesday", "dentist@x.com", "Appointment", "2024-05-02"),
+    ]
+
+    context, stats = make_packer().pack(documents)
+
+    assert stats["passages"] == 2
+    assert "[google/gmail | 2024-05-02 | from: dentist@x.com | subject: Appointment]\nYour dentist appointment is Tuesday" in context
+
+
+def test_overlapping_message_windows_are_merged_in_order():
+    messages = {
+        "a": [{"date": "2024-01-02 10:00:00", "rowid": 1, "sender": "Sam", "text": "hi"}, {"date": "2024-01-02 10:01:00", "rowid": 2, "sender": "me", "text": "hey"}],
+        "b": [{"date": "2024-01-02 10:01:00", "rowid": 2, "sender": "me", "text": "hey"}, {"date": "2024-01-02 10:02:00", "rowid": 3, "sender": "Sam", "text": "lunch?"}],
+    }
+    documents = [
+        Document(id="b", page_content="", metadata={"chat_id": 1, "chat_name": "Sam"}),
+        Document(id="a", page_content="", metadata={"chat_id": 1, "chat_name": "Sam"}),
+    ]
+
+    context, stats = make_packer().pack(documents, lambda document: messages[document.id])
+
+    assert context == "[chat: Sam]\n2024-01-02 10:00 Sam: hi\n2024-01-02 10:01 me: hey\n2024-01-02 10:02 Sam: lunch?"
+    assert stats["merged_chunks"] == 1
+
+
+def test_long_lines_repeated_across_passages_are_dropped():
+    quoted = "On Monday Alice wrote: are we still on for the trip?"
+    documents = [
+        email("1", quoted, "alice@x.com", "Trip", "2024-04-01"),
+        email("2", f"Yes we are\n{quoted}", "bob@x.com", "Re: Trip", "2024-04-02"),
+    ]
+
+    context, stats = make_packer().pack(documents)
+
+    assert context.count(quoted) == 1
+    assert stats["duplicate_lines"] == 1
+
+
+def test_passages_are_truncated_then_dropped_beyond_the_token_budget():
+    documents = [
+        Document(id=str(i), page_content="\n".join(f"line {i}.{j} " + "x" * 30 for j in range(10)), metadata={"source_id": str(i)})
+        for i in range(3)
+    ]
+
+    context, stats = make_packer(max_tokens=150, min_passage_tokens=20).pack(documents)
+
+    assert make_packer().count_tokens(context) <= 150
+    assert stats["truncated_passages"] == 1
+    assert stats["dropped_passages"] == 1
+    assert context.split("\n")[-1].endswith("x" * 30) # cut at a whole line
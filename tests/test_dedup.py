@@ -0,0 +1,83 @@
+import sqlite3
+
+from src.ingestion.dedup import NearDuplicateFilter, get_lsh_bands
+
+
+TEXT = "the quick brown fox jumps over the lazy dog while the cat sleeps on the warm windowsill all afternoon long"
+NEAR_DUPLICATE = TEXT + " today"
+OTHER = "quarterly budget review meeting moved to thursday at three in the main conference room with finance"
+
+
+def count_rows(path, table):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_near_duplicates_within_a_run_are_dropped(tmp_path):
+    dedup = NearDuplicateFilter(str(tmp_path / "dedup.sqlite3"), threshold=0.8)
+
+    assert not dedup.is_duplicate("a", "/a.txt", TEXT)
+    assert dedup.is_duplicate("b", "/b.txt", NEAR_DUPLICATE)
+    assert not dedup.is_duplicate("c", "/c.txt", OTHER)
+    # Chunks of the same source never count as duplicates of each other
+    assert not dedup.is_duplicate("d", "/a.txt", NEAR_DUPLICATE)
+    assert dedup.dropped == 1
+
+
+def test_only_stored_chunks_deduplicate_later_runs(tmp_path):
+    path = str(tmp_path / "dedup.sqlite3")
+    dedup = NearDuplicateFilter(path, threshold=0.8)
+    dedup.is_duplicate("a", "/a.txt", TEXT)
+    dedup.is_duplicate("c", "/c.txt", OTHER)
+    dedup.mark_stored(["a"]) # "c" failed to embed
+    dedup.commit()
+
+    later = NearDuplicateFilter(path, threshold=0.8)
+    assert later.is_duplicate("b", "/b.txt", NEAR_DUPLICATE)
+    assert not later.is_duplicate("e", "/e.txt", OTHER + " again")
+
+
+def test_threshold_change_keeps_signatures_and_rebuilds_buckets(tmp_path):
+    path = str(tmp_path / "dedup.sqlite3")
+    dedup = NearDuplicateFilter(path, threshold=0.9)
+    dedup.is_duplicate("a", "/a.txt", TEXT)
+    dedup.mark_stored(["a"])
+    dedup.commit()
+
+    later = NearDuplicateFilter(path, threshold=0.8)
+
+    assert get_lsh_bands(0.8, 128) != get_lsh_bands(0.9, 128)
+    assert count_rows(path, "signatures") == 1
+    assert count_rows(path, "buckets") == later.bands
+    assert later.is_duplicate("b", "/b.txt", NEAR_DUPLICATE)
+
+
+def test_dry_run_never_writes(tmp_path):
+    path = str(tmp_path / "dedup.sqlite3")
+    dedup = NearDuplicateFilter(path, threshold=0.9)
+    dedup.is_duplicate("a", "/a.txt", TEXT)
+    dedup.mark_stored(["a"])
+    dedup.commit()
+    buckets = count_rows(path, "buckets")
+
+    dry_run = NearDuplicateFilter(path, threshold=0.8, persist=False)
+    assert dry_run.is_duplicate("b", "/b.txt", NEAR_DUPLICATE)
+    dry_run.is_duplicate("c", "/c.txt", OTHER)
+    dry_run.mark_stored(["c"])
+    dry_run.commit()
+    dry_run._conn.close()
+
+    assert count_rows(path, "signatures") == 1
+    assert count_rows(path, "buckets") == buckets
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT bands, rows FROM settings").fetchone() == get_lsh_bands(0.9, 128)
+
+
+def test_removed_chunks_no_longer_deduplicate(tmp_path):
+    dedup = NearDuplicateFilter(str(tmp_path / "dedup.sqlite3"), threshold=0.8)
+    dedup.is_duplicate("a", "/a.txt", TEXT)
+    dedup.mark_stored(["a"])
+
+    dedup.remove(["a"])
+
+    assert not dedup.is_duplicate("b", "/b.txt", NEAR_DUPLICATE)
@@ -0,0 +1,55 @@
+from src.ingestion import email_source
+from src.ingestion.email_source import iter_mbox_documents
+
+
+MBOX = b"""From alice@x.com Mon Apr  1 09:00:00 2024
+From: Alice <alice@x.com>
+Subject: Flight
+Date: Mon, 01 Apr 2024 09:00:00 +0000
+Content-Type: text/html; charset=utf-8
+
+<html><head><style>p { color: red; }</style></head><body><p>Flight is at <b>9am</b></p></body></html>
+
+From bob@x.com Tue Apr  2 10:00:00 2024
+From: Bob <bob@x.com>
+Subject: Broken
+Date: Tue, 02 Apr 2024 10:00:00 +0000
+
+This message has a malformed header
+
+From carol@x.com Wed Apr  3 11:00:00 2024
+From: Carol <carol@x.com>
+Subject: Dinner
+Date: Wed, 03 Apr 2024 11:00:00 +0000
+Content-Type: text/plain
+
+Dinner at 7?
+"""
+
+
+def test_iter_mbox_documents(tmp_path):
+    path = tmp_path / "inbox.mbox"
+    path.write_bytes(MBOX)
+
+    documents = list(iter_mbox_documents([str(path)], 1500))
+
+    assert [document.page_content for document in documents] == ["Flight is at 9am", "This message has a malformed header", "Dinner at 7?"]
+    assert documents[0].metadata["sent_from"] == ["Alice <alice@x.com>"]
+    assert documents[0].metadata["subject"] == "Flight"
+    assert documents[0].metadata["last_modified"] == "2024-04-01T09:00:00+00:00"
+
+
+def test_malformed_message_is_skipped_without_aborting_the_mbox(tmp_path, monkeypatch):
+    path = tmp_path / "inbox.mbox"
+    path.write_bytes(MBOX)
+    get_message_date = email_source.get_message_date
+
+    def raise_on_broken(message):
+        if message["subject"] == "Broken":
+            raise ValueError("malformed header")
+        return get_message_date(message)
+    monkeypatch.setattr(email_source, "get_message_date", raise_on_broken)
+
+    documents = list(iter_mbox_documents([str(path)], 1500))
+
+    assert [document.metadata["subject"] for document in documents] == ["Flight", "Dinner"]
@@ -0,0 +1,27 @@
+from src.utils.helpers import split_message_text
+
+
+def test_short_text_isnt_split():
+    assert split_message_text("hello world", 20) == ([], "hello world")
+
+
+def test_split_at_last_whitespace():
+    assert split_message_text("aaaa bbbb cccc", 10) == (["aaaa bbbb"], "cccc")
+    assert split_message_text("aaaa\nbbbb cccc dddd", 10) == (["aaaa\nbbbb"], "cccc dddd")
+
+
+def test_text_spanning_several_messages():
+    messages, rest = split_message_text("aaaa bbbb cccc dddd eeee", 9)
+    assert messages == ["aaaa bbbb", "cccc dddd"]
+    assert rest == "eeee"
+    assert all(len(message) <= 9 for message in messages)
+
+
+def test_words_longer_than_a_message_are_cut():
+    assert split_message_text("a" * 25, 10) == (["a" * 10, "a" * 10], "a" * 5)
+
+
+def test_whitespace_rest_is_empty():
+    # A complete reply followed by trailing whitespace isn't continued in a blank message
+    assert split_message_text("aaaa bbbb" + " \n\n ", 10) == (["aaaa bbbb"], "")
+    assert split_message_text("a" * 10 + "\n\n", 10) == (["a" * 10], "")
@@ -0,0 +1,84 @@
+import os
+
+from src.ingestion.manifest import IngestManifest, hash_file, make_chunk_id
+
+
+def write_file(path, content):
+    path.write_text(content)
+    return str(path)
+
+
+def test_diff_detects_new_changed_unchanged_and_deleted_files(tmp_path):
+    folder = tmp_path / "notes"
+    folder.mkdir()
+    kept = write_file(folder / "kept.txt", "kept")
+    edited = write_file(folder / "edited.txt", "before")
+    deleted = write_file(folder / "deleted.txt", "deleted")
+
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    for path in (kept, edited, deleted):
+        manifest.record(path, hash_file(path), [f"{path}-chunk"])
+    manifest.save()
+
+    write_file(folder / "edited.txt", "after, with a different size")
+    added = write_file(folder / "added.txt", "added")
+    os.remove(deleted)
+
+    diff = IngestManifest(str(tmp_path / "manifest.json")).diff([kept, edited, added], str(folder), "txt")
+
+    assert diff.unchanged == [kept]
+    assert set(diff.changed) == {edited, added}
+    assert diff.changed[added] == hash_file(added)
+    assert diff.deleted == [os.path.abspath(deleted)]
+
+
+def test_diff_treats_touched_file_with_same_content_as_unchanged(tmp_path):
+    path = write_file(tmp_path / "note.txt", "same")
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    manifest.record(path, hash_file(path), ["chunk"])
+    stats = os.stat(path)
+    os.utime(path, (stats.st_atime, stats.st_mtime + 10))
+
+    diff = manifest.diff([path], str(tmp_path), "txt")
+
+    assert diff.unchanged == [path]
+    assert manifest.files[os.path.abspath(path)]["mtime"] == stats.st_mtime + 10
+
+
+def test_diff_ignores_files_of_other_types_and_folders(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    manifest.record(str(tmp_path / "a" / "gone.csv"), "sha", [], mtime=0, size=0)
+    manifest.record(str(tmp_path / "b" / "gone.txt"), "sha", [], mtime=0, size=0)
+
+    diff = manifest.diff([], str(tmp_path / "a"), "txt")
+
+    assert diff.deleted == []
+
+
+def test_diff_with_force_treats_every_file_as_changed(tmp_path):
+    path = write_file(tmp_path / "note.txt", "same")
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    manifest.record(path, hash_file(path), ["chunk"])
+
+    diff = manifest.diff([path], str(tmp_path), "txt", force=True)
+
+    assert list(diff.changed) == [path]
+
+
+def test_diff_sources():
+    manifest = IngestManifest("/nonexistent/manifest.json")
+    manifest.record("imessage://chat/1", "v1", ["a"])
+    manifest.record("imessage://chat/2", "v1", ["b"])
+
+    diff = manifest.diff_sources({"imessage://chat/1": "v1", "imessage://chat/3": "v1"}, "imessage://")
+
+    assert diff.unchanged == ["imessage://chat/1"]
+    assert diff.changed == {"imessage://chat/3": "v1"}
+    assert diff.deleted == ["imessage://chat/2"]
+
+
+def test_make_chunk_id_is_deterministic_per_source():
+    assert make_chunk_id("/a.txt", "hello") == make_chunk_id("/a.txt", "hello")
+    assert make_chunk_id("/a.txt", "hello") != make_chunk_id("/b.txt", "hello")
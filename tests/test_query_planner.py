@@ -0,0 +1,92 @@
+from datetime import date
+
+from src.ai.query_planner import QueryPlan, get_date_range, get_senders, get_source_types, plan_query
+
+
+# A Saturday
+TODAY = date(2025, 6, 14)
+
+
+def test_relative_dates():
+    assert get_date_range("what did I do yesterday?", TODAY) == (date(2025, 6, 13), date(2025, 6, 13))
+    assert get_date_range("notes from this week", TODAY) == (date(2025, 6, 9), TODAY)
+    assert get_date_range("emails from last month", TODAY) == (date(2025, 5, 1), date(2025, 5, 31))
+    assert get_date_range("places I went in the last 3 weeks", TODAY) == (date(2025, 5, 24), TODAY)
+
+
+def test_absolute_dates():
+    assert get_date_range("meetings on 2024-01-05", TODAY) == (date(2024, 1, 5), date(2024, 1, 5))
+    assert get_date_range("what happened on Jan 5th?", TODAY) == (date(2025, 1, 5), date(2025, 1, 5))
+    # Dates without a year are the most recent past ones
+    assert get_date_range("what happened on Dec 5th?", TODAY) == (date(2024, 12, 5), date(2024, 12, 5))
+    assert get_date_range("trips in March 2023", TODAY) == (date(2023, 3, 1), date(2023, 3, 31))
+    assert get_date_range("what did I watch in 2021", TODAY) == (date(2021, 1, 1), date(2021, 12, 31))
+
+
+def test_open_date_ranges():
+    assert get_date_range("emails since March", TODAY) == (date(2025, 3, 1), TODAY)
+    assert get_date_range("emails after March", TODAY) == (date(2025, 4, 1), TODAY)
+    assert get_date_range("notes before 2020", TODAY) == (None, date(2019, 12, 31))
+
+
+def test_may_is_the_verb_in_any_case():
+    assert get_date_range("May I see my notes from March", TODAY) == (date(2025, 3, 1), date(2025, 3, 31))
+    assert get_date_range("may I see my notes", TODAY) is None
+    assert get_date_range("notes from May 2024", TODAY) == (date(2024, 5, 1), date(2024, 5, 31))
+
+
+def test_years_not_read_from_phone_numbers_or_addresses():
+    assert get_date_range("who has the number 415-555-2013", TODAY) is None
+    assert get_date_range("who called (415) 555 2013", TODAY) is None
+    assert get_date_range("who lives at 2048 Oak Ave", TODAY) is None
+    assert get_date_range("directions to 1999 Mission St", TODAY) is None
+    assert get_date_range("photos from 2019 trip", TODAY) == (date(2019, 1, 1), date(2019, 12, 31))
+
+
+def test_senders():
+    assert get_senders("what did Sam say about the trip?") == ["Sam"]
+    assert get_senders("messages from Jane Doe") == ["Jane Doe"]
+    assert get_senders("Has Sam texted me this week?") == ["Sam"]
+    assert get_senders("Can Alex text me later?") == ["Alex"]
+    assert get_senders("What did I say?") == []
+
+
+def test_ambiguous_words_arent_source_types():
+    assert get_source_types("how long is the drive to Tahoe") == []
+    assert get_source_types("can you search for my passport number") == []
+    assert get_source_types("what's the text of my lease") == []
+    assert get_source_types("what videos have I watched about cooking") == []
+    assert get_source_types("what did I chat about with Sam") == []
+
+
+def test_source_types():
+    assert get_source_types("texts from Sam") == ["apple/messages"]
+    assert get_source_types("what did I google? check my searched history") == ["google/search"]
+    assert get_source_types("emails and meetings") == ["google/gmail", "google/calendar"]
+
+
+def test_filters():
+    plan = plan_query("emails from Sam yesterday", TODAY)
+    assert plan.source_types == ["google/gmail"]
+    assert plan.senders == ["Sam"]
+    assert plan.where == {"$and": [
+        {"type": {"$in": ["google/gmail"]}},
+        {"ts": {"$gte": plan.where["$and"][1]["ts"]["$gte"]}},
+        {"ts": {"$lt": plan.where["$and"][1]["ts"]["$gte"] + 86400}},
+    ]}
+    assert plan.where_document == {"$contains": "Sam"}
+    assert QueryPlan().search_kwargs == {}
+
+
+def test_relaxations_drop_one_filter_at_a_time():
+    plan = QueryPlan(source_types=["google/gmail"], senders=["Sam"], date_range=(TODAY, TODAY))
+    assert plan.relaxations() == [
+        plan,
+        QueryPlan(source_types=["google/gmail"], date_range=(TODAY, TODAY)),
+        QueryPlan(date_range=(TODAY, TODAY)),
+        QueryPlan(),
+    ]
+    # Filters the plan doesn't have aren't relaxed
+    plan = QueryPlan(senders=["Sam"])
+    assert plan.relaxations() == [plan, QueryPlan()]
+    assert QueryPlan().relaxations() == [QueryPlan()]
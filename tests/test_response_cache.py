@@ -0,0 +1,73 @@
+from datetime import date
+
+from src.ai.response_cache import SemanticResponseCache
+from src.ingestion.corpus_version import bump_corpus_version
+
+
+def make_cache(tmp_path, **kwargs):
+    return SemanticResponseCache(str(tmp_path / "corpus_version"), **kwargs)
+
+
+def test_similar_prompt_hits_and_dissimilar_prompt_misses(tmp_path):
+    cache = make_cache(tmp_path, threshold=0.95)
+    response, version = cache.get([1.0, 0.0])
+    assert response is None
+    cache.put("prompt", [1.0, 0.0], "response", version)
+
+    assert cache.get([0.99, 0.01])[0] == "response"
+    assert cache.get([0.0, 1.0])[0] is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_corpus_version_change_invalidates_cache(tmp_path):
+    cache = make_cache(tmp_path)
+    _, version = cache.get([1.0, 0.0])
+    cache.put("prompt", [1.0, 0.0], "response", version)
+
+    bump_corpus_version(str(tmp_path / "corpus_version"))
+
+    assert cache.get([1.0, 0.0])[0] is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_response_generated_while_corpus_changed_is_not_cached(tmp_path):
+    cache = make_cache(tmp_path)
+    _, version = cache.get([1.0, 0.0])
+    bump_corpus_version(str(tmp_path / "corpus_version"))
+    cache.get([0.0, 1.0]) # sees the new version
+
+    cache.put("prompt", [1.0, 0.0], "stale response", version)
+
+    assert cache.get([1.0, 0.0])[0] is None
+
+
+def test_entries_expire_after_ttl(tmp_path):
+    cache = make_cache(tmp_path, ttl=0)
+    _, version = cache.get([1.0, 0.0])
+    cache.put("prompt", [1.0, 0.0], "response", version)
+
+    assert cache.get([1.0, 0.0])[0] is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = make_cache(tmp_path, max_entries=2)
+    _, version = cache.get([1.0, 0.0, 0.0])
+    cache.put("a", [1.0, 0.0, 0.0], "a", version)
+    cache.put("b", [0.0, 1.0, 0.0], "b", version)
+    cache.get([1.0, 0.0, 0.0])
+    cache.put("c", [0.0, 0.0, 1.0], "c", version)
+
+    assert cache.get([1.0, 0.0, 0.0])[0] == "a"
+    assert cache.get([0.0, 1.0, 0.0])[0] is None
+
+
+def test_entries_only_match_prompts_of_the_same_scope(tmp_path):
+    cache = make_cache(tmp_path)
+    yesterday = (date(2024, 5, 1), date(2024, 5, 1))
+    _, version = cache.get([1.0, 0.0], yesterday)
+    cache.put("what did I do yesterday?", [1.0, 0.0], "response", version, yesterday)
+
+    assert cache.get([1.0, 0.0], yesterday)[0] == "response"
+    assert cache.get([1.0, 0.0], (date(2024, 5, 2), date(2024, 5, 2)))[0] is None
+    assert cache.get([1.0, 0.0])[0] is None
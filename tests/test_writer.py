@@ -0,0 +1,97 @@
+from langchain_core.documents import Document
+
+from src.ingestion.writer import BatchedEmbeddingWriter
+
+
+class FakeCollection:
+    def __init__(self):
+        self.rows = {}
+
+    def upsert(self, ids, embeddings, metadatas, documents):
+        for doc_id, embedding, document in zip(ids, embeddings, documents):
+            self.rows[doc_id] = (embedding, document)
+
+
+class FakeVectorstore:
+    def __init__(self):
+        self._collection = FakeCollection()
+
+
+class FakeEmbeddings:
+    """Embeds texts as their length, failing on texts in `failing`, or the first `transient_failures` calls"""
+    def __init__(self, failing=(), transient_failures=0):
+        self.failing = set(failing)
+        self.transient_failures = transient_failures
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        if self.transient_failures:
+            self.transient_failures -= 1
+            raise RuntimeError("rate limited")
+        if self.failing.intersection(texts):
+            raise ValueError("bad text")
+        return [[float(len(text))] for text in texts]
+
+
+def make_documents(count):
+    return [Document(id=f"id-{i}", page_content=f"text {i}") for i in range(count)]
+
+
+def test_write_stores_every_document_in_batches():
+    vectorstore = FakeVectorstore()
+    embeddings = FakeEmbeddings()
+    committed = []
+    writer = BatchedEmbeddingWriter(vectorstore, embeddings, batch_size=4, max_concurrency=2, on_batch_committed=committed.extend)
+
+    writer.write(iter(make_documents(10)))
+
+    assert writer.written == 10
+    assert writer.failed == 0
+    assert sorted(len(call) for call in embeddings.calls) == [2, 4, 4]
+    assert set(vectorstore._collection.rows) == {f"id-{i}" for i in range(10)}
+    assert sorted(committed) == sorted(vectorstore._collection.rows)
+
+
+def test_write_retries_transient_failures():
+    vectorstore = FakeVectorstore()
+    writer = BatchedEmbeddingWriter(vectorstore, FakeEmbeddings(transient_failures=2), batch_size=8, max_concurrency=1, retry_delay=0)
+
+    writer.write(make_documents(3))
+
+    assert writer.written == 3
+    assert writer.failed == 0
+
+
+def test_write_splits_failing_batch_to_isolate_bad_document():
+    vectorstore = FakeVectorstore()
+    embeddings = FakeEmbeddings(failing={"text 5"})
+    committed = []
+    writer = BatchedEmbeddingWriter(vectorstore, embeddings, batch_size=8, max_concurrency=1, max_retries=2, retry_delay=0, on_batch_committed=committed.extend)
+
+    writer.write(make_documents(8))
+
+    assert writer.written == 7
+    assert writer.failed == 1
+    assert writer.failed_ids == {"id-5"}
+    assert "id-5" not in vectorstore._collection.rows
+    assert "id-5" not in committed
+    assert len(vectorstore._collection.rows) == 7
+
+
+def test_write_bumps_corpus_version_and_indexes_stored_batches(tmp_path):
+    class FakeLexicalIndex:
+        def __init__(self):
+            self.ids = []
+
+        def upsert(self, ids, texts, metadatas):
+            self.ids.extend(ids)
+
+    version_path = str(tmp_path / "corpus_version")
+    lexical_index = FakeLexicalIndex()
+    writer = BatchedEmbeddingWriter(FakeVectorstore(), FakeEmbeddings(), batch_size=2, corpus_version_path=version_path, lexical_index=lexical_index)
+
+    writer.write(make_documents(3))
+
+    assert sorted(lexical_index.ids) == ["id-0", "id-1", "id-2"]
+    assert (tmp_path / "corpus_version").read_text()